@@ -0,0 +1,26 @@
+"""add: full-text index over advertisements address and description
+
+Revision ID: 3b7e0d5a1c94
+Revises: f71c3b5e9d42
+Create Date: 2026-10-18 15:06:52.774120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.full_text import ensure_full_text_index, drop_full_text_index
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e0d5a1c94'
+down_revision = 'f71c3b5e9d42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    ensure_full_text_index(op.get_bind())
+
+
+def downgrade() -> None:
+    drop_full_text_index(op.get_bind())
@@ -0,0 +1,30 @@
+"""add: search indexes to advertisements table
+
+Revision ID: 5c1e2a9d7f34
+Revises: 4895101e7d57
+Create Date: 2026-10-18 10:02:11.417203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e2a9d7f34'
+down_revision = '4895101e7d57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_advertisements_type_rooms_count_price', 'advertisements', ['type', 'rooms_count', 'price'], unique=False)
+    op.create_index('ix_advertisements_price', 'advertisements', ['price'], unique=False)
+    op.create_index('ix_advertisements_owner_id', 'advertisements', ['owner_id'], unique=False)
+    op.create_index('ix_advertisements_address', 'advertisements', ['address'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_advertisements_address', table_name='advertisements')
+    op.drop_index('ix_advertisements_owner_id', table_name='advertisements')
+    op.drop_index('ix_advertisements_price', table_name='advertisements')
+    op.drop_index('ix_advertisements_type_rooms_count_price', table_name='advertisements')
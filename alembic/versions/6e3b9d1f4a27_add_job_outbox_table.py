@@ -0,0 +1,36 @@
+"""add: job outbox table
+
+Revision ID: 6e3b9d1f4a27
+Revises: c4a9e2f71b58
+Create Date: 2026-10-18 22:41:05.128394
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e3b9d1f4a27'
+down_revision = 'c4a9e2f71b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('job_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('available_at', sa.DateTime(), nullable=False),
+    sa.Column('failed_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_job_outbox_failed_at_available_at', 'job_outbox', ['failed_at', 'available_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_job_outbox_failed_at_available_at', table_name='job_outbox')
+    op.drop_table('job_outbox')
@@ -0,0 +1,35 @@
+"""add: location columns and spatial index to advertisements table
+
+Revision ID: 8d2f4a6c0e17
+Revises: 3b7e0d5a1c94
+Create Date: 2026-10-18 16:20:41.385902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.geo import ensure_spatial_index, drop_spatial_index
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f4a6c0e17'
+down_revision = '3b7e0d5a1c94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('advertisements', sa.Column('latitude', sa.Double(), nullable=True))
+    op.add_column('advertisements', sa.Column('longitude', sa.Double(), nullable=True))
+    op.add_column('advertisements', sa.Column('geohash', sa.String(length=12), nullable=True))
+    op.create_index(op.f('ix_advertisements_geohash'), 'advertisements', ['geohash'], unique=False)
+    ensure_spatial_index(op.get_bind())
+
+
+def downgrade() -> None:
+    drop_spatial_index(op.get_bind())
+    op.drop_index(op.f('ix_advertisements_geohash'), table_name='advertisements')
+    with op.batch_alter_table('advertisements') as batch_op:
+        batch_op.drop_column('geohash')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
@@ -0,0 +1,30 @@
+"""add: favorites table
+
+Revision ID: 9a3f6d2c81b5
+Revises: 5c1e2a9d7f34
+Create Date: 2026-10-18 11:24:37.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a3f6d2c81b5'
+down_revision = '5c1e2a9d7f34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('favorites',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('ad_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ad_id'], ['advertisements.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'ad_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('favorites')
@@ -0,0 +1,47 @@
+"""add: AUTOINCREMENT ids for advertisements and users on SQLite
+
+Revision ID: b5d7f0c3e8a1
+Revises: 6e3b9d1f4a27
+Create Date: 2026-10-19 10:14:52.318470
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.full_text import ensure_full_text_index
+from app.utils.geo import ensure_spatial_index
+from app.utils.stats import ensure_price_stats
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d7f0c3e8a1'
+down_revision = '6e3b9d1f4a27'
+branch_labels = None
+depends_on = None
+
+
+def set_autoincrement(enabled: bool) -> None:
+    # Postgres sequences never hand out an id twice; SQLite only stops
+    # reusing the largest deleted id with AUTOINCREMENT, which needs the
+    # table rebuilt.
+    connection = op.get_bind()
+    if connection.dialect.name != "sqlite":
+        return
+
+    for table in ("advertisements", "users"):
+        with op.batch_alter_table(table, recreate="always", table_kwargs={"sqlite_autoincrement": enabled}):
+            pass
+
+    # Dropping the old advertisements table dropped its triggers too; the
+    # index tables themselves still hold the same ids.
+    ensure_full_text_index(connection)
+    ensure_spatial_index(connection)
+    ensure_price_stats(connection)
+
+
+def upgrade() -> None:
+    set_autoincrement(True)
+
+
+def downgrade() -> None:
+    set_autoincrement(False)
@@ -0,0 +1,26 @@
+"""add: trigger-maintained price statistics per type and rooms count
+
+Revision ID: c4a9e2f71b58
+Revises: 8d2f4a6c0e17
+Create Date: 2026-10-18 21:12:37.408215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.stats import ensure_price_stats, drop_price_stats
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a9e2f71b58'
+down_revision = '8d2f4a6c0e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    ensure_price_stats(op.get_bind())
+
+
+def downgrade() -> None:
+    drop_price_stats(op.get_bind())
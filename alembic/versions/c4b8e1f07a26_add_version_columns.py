@@ -0,0 +1,31 @@
+"""add: version columns to advertisements, users and comments tables
+
+Revision ID: c4b8e1f07a26
+Revises: 9a3f6d2c81b5
+Create Date: 2026-10-18 12:40:05.513870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4b8e1f07a26'
+down_revision = '9a3f6d2c81b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('advertisements', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('users', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('comments', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('comments') as batch_op:
+        batch_op.drop_column('version')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('version')
+    with op.batch_alter_table('advertisements') as batch_op:
+        batch_op.drop_column('version')
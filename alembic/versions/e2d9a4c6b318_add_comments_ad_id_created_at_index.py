@@ -0,0 +1,27 @@
+"""add: (ad_id, created_at, id) index to comments table
+
+Revision ID: e2d9a4c6b318
+Revises: c4b8e1f07a26
+Create Date: 2026-10-18 13:31:48.270639
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2d9a4c6b318'
+down_revision = 'c4b8e1f07a26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Comments were stored without a timestamp until now; give them one so
+    # they take part in (created_at, id) keyset pagination.
+    op.execute("UPDATE comments SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    op.create_index('ix_comments_ad_id_created_at_id', 'comments', ['ad_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_comments_ad_id_created_at_id', table_name='comments')
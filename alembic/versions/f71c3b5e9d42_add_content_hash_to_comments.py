@@ -0,0 +1,57 @@
+"""add: content_hash column and duplicate lookup index to comments table
+
+Revision ID: f71c3b5e9d42
+Revises: e2d9a4c6b318
+Create Date: 2026-10-18 14:12:26.038417
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f71c3b5e9d42'
+down_revision = 'e2d9a4c6b318'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    op.add_column('comments', sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    # Keyset over id in chunks, each written with one executemany, so the
+    # backfill neither loads the whole table nor pays a round trip per row.
+    comments = sa.table('comments', sa.column('id', sa.Integer), sa.column('content', sa.String), sa.column('content_hash', sa.String))
+    connection = op.get_bind()
+    update = (
+        comments.update()
+        .where(comments.c.id == sa.bindparam('comment_id'))
+        .values(content_hash=sa.bindparam('hash'))
+    )
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(comments.c.id, comments.c.content)
+            .where(comments.c.id > last_id)
+            .order_by(comments.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(update, [
+            {'comment_id': row.id, 'hash': hashlib.sha256((row.content or "").strip().encode()).hexdigest()}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+    op.create_index('ix_comments_ad_id_owner_id_content_hash', 'comments', ['ad_id', 'owner_id', 'content_hash', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_comments_ad_id_owner_id_content_hash', table_name='comments')
+    with op.batch_alter_table('comments') as batch_op:
+        batch_op.drop_column('content_hash')
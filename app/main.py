@@ -1,62 +1,188 @@
-from fastapi import FastAPI, Response, Depends, HTTPException, Form, Cookie, Request
-from fastapi.responses import RedirectResponse, ORJSONResponse
+import asyncio
+import logging
+import time
+
+from fastapi import FastAPI, Response, Depends, HTTPException, Form, Cookie, Request, Query
+from fastapi.responses import RedirectResponse, ORJSONResponse, StreamingResponse
+from pydantic import ValidationError
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from jose import jwt
 from datetime import datetime
 from typing import Optional
 
 from .utils.ads_repository import Ad, AdsRepository, AdCreate
 from .utils.users_repository import User, UsersRepository, UserCreate
 from .utils.comments_repository import Comment, CommentsRepository, CommentCreate
-from .utils.database import Base, engine, SessionLocal
-from .utils.schemas import UserCreateRequest, UserProfileResponse, UserProfileEdit, AdCreateRequest, AdResponse, AdEdit, CommentCreateRequest, CommentEdit
+from .utils.favorites_repository import FavoritesRepository
+from .utils.database import Base, env_flag, engine, async_engine, SessionLocal, AsyncSessionLocal, USE_ASYNC_DATABASE, POOL_SIZE, MAX_OVERFLOW
+from .utils.async_repository import AsyncRepository
+from .utils.bulk import iter_records, encode_ndjson, encode_csv, stream_rows
+from .utils.cache import create_cache
+from .utils.etag import etag_response
+from .utils.full_text import ensure_full_text_index
+from .utils.geo import MAX_RADIUS_KM, MAX_ZOOM, MIN_ZOOM, ensure_spatial_index
+from .utils.jobs import JOBS_ENABLED, JobQueue
+from .utils.metrics import MetricsMiddleware, instrument_engine, mark_process_dead, render_metrics
+from .utils.ownership import WriteResult
+from .utils.pagination import INTEGER_MAX, encode_cursor, decode_cursor, is_integer
+from .utils.query_trace import SQL_TRACE, QueryTraceMiddleware, instrument_queries
+from .utils.passwords import PasswordHasher
+from .utils.rate_limit import RateLimitMiddleware, create_rate_limit_store, load_rules
+from .utils.stats import ensure_price_stats
+from .utils.tokens import InvalidTokenError, TokenManager
+from .utils.schemas import UserCreateRequest, UserProfileResponse, TokenResponse, UserProfileEdit, AdCreateRequest, AdCreatedResponse, AdDetailResponse, AdSearchResponse, AdStatsResponse, AdEdit, FavoritesResponse, CommentCreateRequest, CommentEdit, CommentsPageResponse
 
 
 Base.metadata.create_all(bind=engine)
+# Installs the index and stats triggers on a fresh database; on Postgres each
+# is skipped once present, so booting workers take no lock on advertisements.
+with engine.begin() as connection:
+    ensure_full_text_index(connection)
+    ensure_spatial_index(connection)
+    ensure_price_stats(connection)
 
-app = FastAPI()
+instrument_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine)
+instrument_queries()
 
-users_repository = UsersRepository()
-ads_repository = AdsRepository()
-comments_repository = CommentsRepository()
+app = FastAPI(default_response_class=ORJSONResponse)
+
+users_repository = AsyncRepository(UsersRepository())
+ads_repository = AsyncRepository(AdsRepository(cache=create_cache(name="ads", async_database=USE_ASYNC_DATABASE)))
+comments_repository = AsyncRepository(CommentsRepository())
+favorites_repository = AsyncRepository(FavoritesRepository())
+
+password_hasher = PasswordHasher()
+token_manager = TokenManager()
+
+
+def identify_user(token: str) -> str | None:
+    try:
+        return token_manager.decode(token)["sub"]
+    except InvalidTokenError:
+        return None
+
+
+notifications_logger = logging.getLogger("saniraq.notifications")
+
+# Side effects of writes run here, off the request path. create_ad and
+# create_comment write their outbox rows in the same transaction as the row
+# itself; with JOBS_ENABLED=false this process only writes them and another
+# one with jobs enabled runs them.
+job_queue = JobQueue(SessionLocal)
+
+
+@job_queue.register("ad_created")
+def warm_ad_detail(db: Session, payload: dict):
+    ads_repository.repository.get_ad_detail(db=db, ad_id=payload["ad_id"])
+
+
+@job_queue.register("comment_created")
+def notify_ad_owner(db: Session, payload: dict):
+    db_ad = ads_repository.repository.get_ad_owner(db=db, ad_id=payload["ad_id"])
+    if db_ad is not None:
+        notifications_logger.info("New comment %s for user %s on advertisement %s", payload["comment_id"], db_ad.owner_id, db_ad.id)
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/users/login")
 
+if env_flag("RATE_LIMIT_ENABLED", "true"):
+    rules, default_rule = load_rules()
+    app.add_middleware(RateLimitMiddleware, store=create_rate_limit_store(), rules=rules, default=default_rule, identify=identify_user)
 
-def get_db():
-    db = SessionLocal()
+# Needs MetricsMiddleware outside it for the per-request stats.
+if SQL_TRACE:
+    app.add_middleware(QueryTraceMiddleware)
+
+# Added last so it wraps everything, including requests the limiter rejects.
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+
+if JOBS_ENABLED:
+    app.add_event_handler("startup", job_queue.start)
+    app.add_event_handler("shutdown", job_queue.stop)
+app.add_event_handler("shutdown", mark_process_dead)
+
+MAX_PAGE_SIZE = 100
+MAX_IMPORT_ERRORS = 100
+# /shanyraks answers JSON, NDJSON or CSV by Accept, and per user when signed in.
+SEARCH_VARY = "Authorization, Accept"
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/users/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/users/login", auto_error=False)
+
+
+if USE_ASYNC_DATABASE:
+    async def get_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+else:
+    # Sync sessions keep their connection between threadpool calls, so cap
+    # open sessions at the pool capacity; otherwise worker threads can block
+    # on checkout while the connections they wait for sit idle in requests
+    # queued behind them.
+    db_slots = asyncio.Semaphore(POOL_SIZE + MAX_OVERFLOW)
+
+    async def get_db():
+        async with db_slots:
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                await run_in_threadpool(db.close)
+
+
+async def get_token_claims(token: str=Depends(oauth2_scheme)) -> dict:
     try:
-        yield db
-    finally:
-        db.close()
+        return token_manager.decode(token)
+    except InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+async def get_current_user_id(
+    claims: dict=Depends(get_token_claims)
+) -> int:
+    return int(claims["sub"])
 
 
-def encode_jwt(username: str) -> dict:
-    body = {"username": username}
-    token = jwt.encode(body, "test", 'HS256')
-    dict_token = {"token": token}
-    return dict_token["token"]
+def check_write(result: WriteResult, not_found: str = "Advertisement not found"):
+    if result is WriteResult.PARENT_NOT_FOUND:
+        raise HTTPException(status_code=404, detail="Advertisement not found")
+    if result is WriteResult.NOT_FOUND:
+        raise HTTPException(status_code=404, detail=not_found)
+    if result is WriteResult.FORBIDDEN:
+        raise HTTPException(status_code=403, detail="Has no rights")
+
+
+async def get_current_user(
+    user_id: int=Depends(get_current_user_id),
+    db: Session=Depends(get_db)
+) -> User:
+    user = await users_repository.get_cached_user_by_id(db=db, user_id=user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return user
 
 
-def decode_jwt(token: dict):
-    data = jwt.decode(token, "test", 'HS256')
-    return data["username"]
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
 
 
 @app.post("/auth/users")
-def signup(
+async def signup(
     input: UserCreateRequest, 
     db: Session = Depends(get_db)
 ):
-    db_user = users_repository.get_user_by_username(db=db, username=input.username)
+    db_user = await users_repository.get_user_by_username(db=db, username=input.username)
     if db_user != None:
         raise HTTPException(status_code=403, detail="User is already exists")
 
-    created_user = users_repository.create_user(db=db, user=UserCreate(
+    created_user = await users_repository.create_user(db=db, user=UserCreate(
         username=input.username,
         phone=input.phone,
-        password=input.password,
+        password=await password_hasher.hash_async(input.password),
         name=input.name,
         city=input.city
     ))
@@ -64,302 +190,485 @@ def signup(
     return Response(status_code=200)
 
 
-@app.post("/auth/users/login")
-def login(
+@app.post("/auth/users/login", response_model=TokenResponse)
+async def login(
     username: str=Form(),
     password: str=Form(),
     db: Session = Depends(get_db),
 ):
-    user = users_repository.get_user_by_username(db=db, username=username)
+    user = await users_repository.get_user_by_username(db=db, username=username)
     if not user:
         raise HTTPException(status_code=404, detail="User is not found")
 
-    if user.password != password:
+    valid, new_hash = await password_hasher.check_async(user.password, password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Incorrect password")
 
-    token = encode_jwt(username=username)
-    return {"access_token": token}
-
-
-# def get_current_user(
-#     db: Session=Depends(get_db),
-#     token: str=Depends(oauth2_scheme)
-# ):
-#     decoded_username = decode_jwt(token=token)
-#     user = users_repository.get_user_by_username(db=db, username=str(decoded_username))
+    # The cost parameters changed since this hash was made (or it predates
+    # hashing); swap in a fresh hash while the plain password is at hand.
+    if new_hash is not None:
+        await users_repository.update_password(db=db, user_id=user.id, password=new_hash)
 
-#     if not str(decoded_username):
-#         raise HTTPException(status_code=400, detail="Invalid token")
-    
-#     if not user:
-#         raise HTTPException(status_code=404, detail="User not found")
-
-#     return user
+    token = token_manager.encode(user_id=user.id, username=user.username)
+    return {"access_token": token}
 
 
 @app.patch("/auth/users/me")
-def edit_profile(
+async def edit_profile(
     input: UserProfileEdit,
     db: Session=Depends(get_db),
-    token: str=Depends(oauth2_scheme), 
+    user: User=Depends(get_current_user)
 ):
-    decode_username = decode_jwt(token=token)
-    user = users_repository.get_user_by_username(db=db, username=decode_username)
-    edited_user = users_repository.update_user(db=db, prev_user=user, new_user=input)
-
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    edited_user = await users_repository.update_user(db=db, prev_user=user, new_user=input)
 
     return Response(status_code=200)
 
 
-@app.get("/auth/users/me")
-def show_profile(
-    db: Session=Depends(get_db), 
-    token: str=Depends(oauth2_scheme)
+@app.get("/auth/users/me", response_model=UserProfileResponse)
+async def show_profile(
+    request: Request,
+    user: User=Depends(get_current_user)
 ):
-    decode_username = decode_jwt(token=token)
-    user = users_repository.get_user_by_username(db=db, username=decode_username)
-    return {
+    return etag_response(request, {
         "id": user.id,
         "username":user.username,
         "phone": user.phone,
         "name": user.name,
         "city": user.city
-    }
+    }, version_tag=f"user-{user.id}-v{user.version}")
 
 
-@app.post("/shanyraks")
-def create_ad(
+@app.post("/shanyraks", response_model=AdCreatedResponse)
+async def create_ad(
     input: AdCreateRequest,
     db: Session=Depends(get_db),
-    token: str=Depends(oauth2_scheme)
+    current_user_id: int=Depends(get_current_user_id)
 ):
-    decode_username = decode_jwt(token=token)
-    db_ad = ads_repository.get_ad_by_address(db=db, address=input.address)
-    db_user = users_repository.get_user_by_username(db=db, username=decode_username)
+    existing = await ads_repository.get_existing_addresses(db=db, addresses=[input.address])
 
-    if db_ad:
+    if existing:
         raise HTTPException(status_code=403, detail="Advertisement is already exists")
 
-    created_ad = ads_repository.create_ad(db=db, ad=AdCreate(
+    created_ad = await ads_repository.create_ad(db=db, ad=AdCreate(
         type=input.type,
         price=input.price,
         address=input.address,
         area=input.area,
         rooms_count=input.rooms_count,
         description=input.description,
-        owner_id=db_user.id
+        owner_id=current_user_id,
+        latitude=input.latitude,
+        longitude=input.longitude
     ))
+    job_queue.notify()
 
     return {"id": created_ad.id}
 
 
-@app.get("/shanyraks/{id}")
-def get_ad(
-    id: int,
-    db: Session=Depends(get_db),
-    token: str=Depends(oauth2_scheme)
+def get_location_filter(
+    min_lat: Optional[float]=Query(None, ge=-90, le=90),
+    min_lng: Optional[float]=Query(None, ge=-180, le=180),
+    max_lat: Optional[float]=Query(None, ge=-90, le=90),
+    max_lng: Optional[float]=Query(None, ge=-180, le=180),
+    lat: Optional[float]=Query(None, ge=-90, le=90),
+    lng: Optional[float]=Query(None, ge=-180, le=180),
+    radius_km: Optional[float]=Query(None, gt=0, le=MAX_RADIUS_KM)
+) -> tuple:
+    bbox = (min_lat, min_lng, max_lat, max_lng)
+    if all(value is None for value in bbox):
+        bbox = None
+    elif any(value is None for value in bbox):
+        raise HTTPException(status_code=400, detail="Bounding box needs min_lat, min_lng, max_lat and max_lng")
+
+    near = (lat, lng, radius_km)
+    if all(value is None for value in near):
+        near = None
+    elif any(value is None for value in near):
+        raise HTTPException(status_code=400, detail="Radius search needs lat, lng and radius_km")
+
+    return bbox, near
+
+
+@app.get("/shanyraks/stats", response_model=AdStatsResponse)
+async def get_stats(
+    type: Optional[str] = None,
+    rooms_count: Optional[int] = None,
+    db: Session=Depends(get_db)
 ):
-    db_ad = ads_repository.get_ad_by_id(db=db, ad_id=id)
+    return await ads_repository.get_stats(db=db, type=type, rooms_count=rooms_count)
 
-    if not db_ad:
-        raise HTTPException(status_code=404, detail="Advertisement not found")
-    
+
+@app.get("/shanyraks/tiles")
+async def get_tiles(
+    zoom: int=Query(ge=MIN_ZOOM, le=MAX_ZOOM),
+    type: Optional[str] = None,
+    rooms_count: Optional[int] = None,
+    price_from: Optional[int] = None,
+    price_until: Optional[int] = None,
+    location: tuple=Depends(get_location_filter),
+    db: Session=Depends(get_db)
+):
+    bbox, near = location
+    if bbox is None:
+        raise HTTPException(status_code=400, detail="Bounding box is required")
+
+    cells = await ads_repository.get_tiles(db=db, bbox=bbox, zoom=zoom, type=type, rooms_count=rooms_count, price_from=price_from, price_until=price_until)
+
+    return {"zoom": zoom, "cells": cells}
+
+
+async def import_batch(db: Session, batch: list[AdCreateRequest], owner_id: int, seen: set[str]) -> tuple[int, int]:
+    # One set-based lookup per batch instead of get_ad_by_address per row;
+    # seen also drops repeats within the upload itself.
+    existing = await ads_repository.get_existing_addresses(db=db, addresses=list({ad.address for ad in batch}))
+    ads = []
+    for ad in batch:
+        if ad.address in existing or ad.address in seen:
+            continue
+        seen.add(ad.address)
+        ads.append(AdCreate(
+            type=ad.type,
+            price=ad.price,
+            address=ad.address,
+            area=ad.area,
+            rooms_count=ad.rooms_count,
+            description=ad.description,
+            owner_id=owner_id,
+            latitude=ad.latitude,
+            longitude=ad.longitude
+        ))
+
+    imported = await ads_repository.bulk_create_ads(db=db, ads=ads)
+    return imported, len(batch) - imported
+
+
+@app.post("/shanyraks/import")
+async def import_ads(
+    request: Request,
+    batch_size: int=Query(1000, ge=1, le=10000),
+    db: Session=Depends(get_db),
+    current_user_id: int=Depends(get_current_user_id)
+):
+    format = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+    started = time.perf_counter()
+
+    imported, duplicates, rows = 0, 0, 0
+    # Only the first MAX_IMPORT_ERRORS are kept, so a large bad upload costs
+    # a counter rather than memory.
+    errors, error_count = [], 0
+    seen = set()
+    batch = []
+
+    async for line, row in iter_records(request.stream(), format):
+        rows += 1
+        error = row if isinstance(row, str) else None
+        if error is None:
+            try:
+                batch.append(AdCreateRequest(**row))
+            except ValidationError as e:
+                error = e
+        if error is not None:
+            error_count += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({"line": line, "error": str(error)})
+            continue
+
+        if len(batch) >= batch_size:
+            batch_imported, batch_duplicates = await import_batch(db, batch, current_user_id, seen)
+            imported += batch_imported
+            duplicates += batch_duplicates
+            batch = []
+
+    if batch:
+        batch_imported, batch_duplicates = await import_batch(db, batch, current_user_id, seen)
+        imported += batch_imported
+        duplicates += batch_duplicates
+
+    elapsed = time.perf_counter() - started
     return {
-        "id": db_ad.id,
-        "type": db_ad.type,
-        "price": db_ad.price,
-        "address": db_ad.address,
-        "area": db_ad.address,
-        "rooms_count": db_ad.rooms_count,
-        "description": db_ad.description,
-        "user_id": db_ad.owner_id
+        "rows": rows,
+        "imported": imported,
+        "duplicates": duplicates,
+        "error_count": error_count,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed) if elapsed else rows
     }
 
 
-@app.patch("/shanyraks/{id}")
-def edit_ad(
+@app.get("/shanyraks/export")
+async def export_ads(
+    format: str="ndjson",
+    batch_size: int=Query(1000, ge=1, le=10000),
+    mine: bool=False,
+    db: Session=Depends(get_db),
+    current_user_id: int=Depends(get_current_user_id)
+):
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Format must be ndjson or csv")
+
+    async def content():
+        after_id = 0
+        first = True
+        while True:
+            page = await ads_repository.get_ads_after_id(db=db, after_id=after_id, limit=batch_size, owner_id=current_user_id if mine else None)
+            if format == "csv":
+                yield encode_csv(page, header=first)
+            else:
+                yield encode_ndjson(page)
+
+            if len(page) < batch_size:
+                break
+            after_id = page[-1]["id"]
+            first = False
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(content(), media_type=media_type)
+
+
+@app.get("/shanyraks/{id}", response_model=AdDetailResponse)
+async def get_ad(
     id: int,
-    input: AdEdit,
+    request: Request,
     db: Session=Depends(get_db),
     token: str=Depends(oauth2_scheme)
 ):
-    decode_username = decode_jwt(token=token)
-    db_ad = ads_repository.get_ad_by_id(db=db, ad_id=id)
-    current_user = users_repository.get_user_by_username(db=db, username=decode_username)
+    db_ad = await ads_repository.get_ad_detail(db=db, ad_id=id)
 
     if not db_ad:
         raise HTTPException(status_code=404, detail="Advertisement not found")
 
-    if current_user.id != db_ad.owner_id:
-        raise HTTPException(status_code=403, detail="Has no rights")
+    payload, version = db_ad
+    return etag_response(request, payload, version_tag=f"ad-{id}-v{version}")
 
-    edited_ad = ads_repository.update_ad(db=db, ad_id=id, new_data=input)
+
+@app.patch("/shanyraks/{id}")
+async def edit_ad(
+    id: int,
+    input: AdEdit,
+    db: Session=Depends(get_db),
+    current_user_id: int=Depends(get_current_user_id)
+):
+    result = await ads_repository.update_ad(db=db, ad_id=id, owner_id=current_user_id, new_data=input)
+    check_write(result)
 
     return Response(status_code=200)
 
 
 @app.delete("/shanyraks/{id}")
-def delete_ad(
+async def delete_ad(
     id: int,
     db: Session=Depends(get_db),
-    token: str=Depends(oauth2_scheme)
+    current_user_id: int=Depends(get_current_user_id)
 ):
-    decode_username = decode_jwt(token=token)
-    db_ad = ads_repository.get_ad_by_id(db=db, ad_id=id)
-    current_user = users_repository.get_user_by_username(db=db, username=decode_username)
-
-
-    if not db_ad:
-        raise HTTPException(status_code=404, detail="Advertisement not found")
-
-    if current_user.id != db_ad.owner_id:
-        raise HTTPException(status_code=403, detail="Has no rights")
-
-    deleted_ad = ads_repository.delete_ad_by_id(db=db, ad_id=id)
+    result = await ads_repository.delete_ad_by_id(db=db, ad_id=id, owner_id=current_user_id)
+    check_write(result)
 
     return Response(status_code=200)
 
 
 @app.post("/shanyraks/{id}/comments")
-def create_comment(
+async def create_comment(
     input: CommentCreateRequest,
     id: int,
     db: Session=Depends(get_db),
-    token: str=Depends(oauth2_scheme)
+    current_user_id: int=Depends(get_current_user_id)
 ):
-    decode_username = decode_jwt(token=token)
-    db_comment = comments_repository.get_comment_by_content(db=db, content=input.content)
-    db_user = users_repository.get_user_by_username(db=db, username=decode_username)
+    db_comment = await comments_repository.get_recent_duplicate(db=db, ad_id=id, owner_id=current_user_id, content=input.content)
 
     if db_comment:
         raise HTTPException(status_code=403, detail="Comment is already exists")
 
-    created_comment = comments_repository.create_comment(db=db, comment=CommentCreate(
+    created_comment = await comments_repository.create_comment(db=db, comment=CommentCreate(
         content=input.content,
-        created_at=str(datetime.now()),
+        created_at=datetime.now(),
         edited=False,
-        owner_id=db_user.id,
+        owner_id=current_user_id,
         ad_id=id
     ))
+    job_queue.notify()
 
     return Response(status_code=200)
 
 
-@app.get("/shanyraks/{id}/comments")
-def show_comments(
+@app.get("/shanyraks/{id}/comments", response_model=CommentsPageResponse)
+async def show_comments(
     id: int,
+    request: Request,
+    limit: int=Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    embed_author: bool=False,
     db: Session=Depends(get_db),
     token: str=Depends(oauth2_scheme)
 ):
-    db_ad = ads_repository.get_ad_by_id(db=db, ad_id=id)
-    db_comments = comments_repository.get_comments_by_ad_id(db=db, ad_id=id)
+    after = None
+    if cursor:
+        try:
+            created_at, comment_id = decode_cursor(cursor)
+            after = (datetime.fromisoformat(created_at), comment_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        if not is_integer(comment_id):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    db_ad = await ads_repository.get_ad_owner(db=db, ad_id=id)
 
     if not db_ad:
         raise HTTPException(status_code=404, detail="Advertisement not found")
 
-    if not db_comments:
+    db_comments = await comments_repository.get_comments_page(db=db, ad_id=id, limit=limit, after=after, with_author=embed_author)
+
+    if not db_comments and not cursor:
         raise HTTPException(status_code=404, detail="No comments")
 
-    return {"comments": db_comments}
+    next_cursor = None
+    if db_comments and len(db_comments) == limit:
+        next_cursor = encode_cursor(db_comments[-1]["created_at"].isoformat(), db_comments[-1]["id"])
+
+    return etag_response(request, {"comments": db_comments, "next_cursor": next_cursor})
     
 
 @app.patch("/shanyraks/{id}/comments/{comment_id}")
-def edit_comment(
+async def edit_comment(
     id: int,
     comment_id:int,
     input: CommentEdit,
     db: Session=Depends(get_db),
-    token: str=Depends(oauth2_scheme)
+    current_user_id: int=Depends(get_current_user_id)
 ):
-    decode_username = decode_jwt(token=token)
-    db_ad = ads_repository.get_ad_by_id(db=db, ad_id=id)
-    db_comment = comments_repository.get_comment_by_id(db=db, comment_id=comment_id)
-    current_user = users_repository.get_user_by_username(db=db, username=decode_username)
-
-    if not db_ad:
-        raise HTTPException(status_code=404, detail="Advertisement not found")
-
-    if not db_comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-
-    if current_user.id != db_comment.owner_id:
-        raise HTTPException(status_code=403, detail="Has no rights")
-
-    edited_comment = comments_repository.update_comment(db=db, comment_id=comment_id, new_data=input)
+    result = await comments_repository.update_comment(db=db, ad_id=id, comment_id=comment_id, owner_id=current_user_id, new_data=input)
+    check_write(result, not_found="Comment not found")
 
     return Response(status_code=200)
 
 
 @app.delete("/shanyraks/{id}/comments/{comment_id}")
-def delete_comment(
+async def delete_comment(
     id: int,
     comment_id: int,
     db: Session=Depends(get_db),
-    token: str=Depends(oauth2_scheme)
+    current_user_id: int=Depends(get_current_user_id)
 ):
-    decode_username = decode_jwt(token=token)
-    db_ad = ads_repository.get_ad_by_id(db=db, ad_id=id)
-    db_comment = comments_repository.get_comment_by_id(db=db, comment_id=comment_id)
-    current_user = users_repository.get_user_by_username(db=db, username=decode_username)
-
-    if not db_ad:
-        raise HTTPException(status_code=404, detail="Advertisement not found")
-
-    if not db_comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-
-    if current_user.id == db_comment.owner_id or current_user.id == db_ad.owner_id:
-        delete_comment = comments_repository.delete_comment_by_id(db=db, comment_id=comment_id)
-        return Response(status_code=200)
+    result = await comments_repository.delete_comment_by_id(db=db, ad_id=id, comment_id=comment_id, user_id=current_user_id)
+    check_write(result, not_found="Comment not found")
 
-    raise HTTPException(status_code=403, detail="Has no rights")
+    return Response(status_code=200)
 
 
 @app.post("/auth/users/favorites/shanyraks/{id}")
-def add_to_favorite(
+async def add_to_favorite(
     id: int,
     db: Session=Depends(get_db),
-    token: str=Depends(oauth2_scheme)
+    current_user_id: int=Depends(get_current_user_id)
 ):
-    favorites = ads_repository.add_to_favorite_list(db=db, ad_id=id)
+    db_ad = await ads_repository.get_ad_owner(db=db, ad_id=id)
+
+    if not db_ad:
+        raise HTTPException(status_code=404, detail="Advertisement not found")
+
+    await favorites_repository.add_favorite(db=db, user_id=current_user_id, ad_id=id)
 
     return Response(status_code=200)
 
 
-@app.get("/auth/users/favorites/shanyraks")
-def get_favorites(
+@app.get("/auth/users/favorites/shanyraks", response_model=FavoritesResponse)
+async def get_favorites(
     db: Session=Depends(get_db),
-    token: str=Depends(oauth2_scheme)
+    current_user_id: int=Depends(get_current_user_id)
 ):
-    return {"shanyraks": ads_repository.get_all_favorites()}
+    return {"shanyraks": await favorites_repository.get_favorites(db=db, user_id=current_user_id)}
 
 
 @app.delete("/auth/users/favorites/shanyraks/{id}")
-def delete_from_favorites(
+async def delete_from_favorites(
     id: int,
     db: Session=Depends(get_db),
-    token: str=Depends(oauth2_scheme)
+    current_user_id: int=Depends(get_current_user_id)
 ):
-    favorites = ads_repository.delete_favorite_ad_by_id(ad_id=id)
+    deleted = await favorites_repository.delete_favorite(db=db, user_id=current_user_id, ad_id=id)
 
     return Response(status_code=200)
 
 
-@app.get("/shanyraks")
-def search(
-    limit: int=10,
-    offset: int=0,
+@app.get("/shanyraks", response_model=AdSearchResponse)
+async def search(
+    request: Request,
+    limit: Optional[int]=Query(None, ge=1),
+    offset: int=Query(0, ge=0, le=INTEGER_MAX),
     type: Optional[str] = None,
     rooms_count: Optional[int] = None,
     price_from: Optional[int] = None,
     price_until: Optional[int] = None,
-    db: Session=Depends(get_db)
+    cursor: Optional[str] = None,
+    q: Optional[str] = None,
+    with_comment_count: bool=False,
+    location: tuple=Depends(get_location_filter),
+    db: Session=Depends(get_db),
+    token: Optional[str]=Depends(optional_oauth2_scheme)
 ):
-    objects = ads_repository.get_ads(db=db, skip=offset, limit=limit, type=type, rooms_count = rooms_count, price_from = price_from, price_until = price_until)
-
-    return {
-        "total": len(objects),
-        "objects": objects
-    }
+    bbox, near = location
+
+    # Export-style clients ask for NDJSON or CSV and get every matching row
+    # streamed off a server-side cursor instead of one page of JSON.
+    accept = request.headers.get("accept", "")
+    stream_format = "csv" if "text/csv" in accept else "ndjson" if "application/x-ndjson" in accept else None
+    if stream_format:
+        statement = ads_repository.repository.search_statement(dialect=engine.dialect.name, limit=limit, type=type, rooms_count=rooms_count, price_from=price_from, price_until=price_until, q=q, bbox=bbox, near=near)
+        media_type = "text/csv" if stream_format == "csv" else "application/x-ndjson"
+        # Never stored: an export can be huge, and a cache that kept it
+        # would also have to key it on Accept.
+        return StreamingResponse(stream_rows(db, statement, stream_format), media_type=media_type, headers={
+            "Cache-Control": "no-store",
+            "Vary": SEARCH_VARY
+        })
+
+    # Streams may ask for any number of rows; a JSON page holds at most
+    # MAX_PAGE_SIZE.
+    limit = min(limit or 10, MAX_PAGE_SIZE)
+
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        if len(after) != 2 or not all(is_integer(value) for value in after):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    objects, total = await ads_repository.search_ads(db=db, skip=offset, limit=limit, type=type, rooms_count = rooms_count, price_from = price_from, price_until = price_until, after=after, q=q, bbox=bbox, near=near)
+
+    claims = None
+    if token:
+        try:
+            claims = token_manager.decode(token)
+        except InvalidTokenError:
+            pass
+
+    if claims:
+        favorite_ids = await favorites_repository.get_favorite_ad_ids(
+            db=db, user_id=int(claims["sub"]), ad_ids=[ad["id"] for ad in objects]
+        )
+        for ad in objects:
+            ad["is_favorite"] = ad["id"] in favorite_ids
+
+    if with_comment_count:
+        comment_counts = await comments_repository.count_comments_by_ad_ids(db=db, ad_ids=[ad["id"] for ad in objects])
+        for ad in objects:
+            ad["comment_count"] = comment_counts.get(ad["id"], 0)
+
+    next_cursor = None
+    if objects and len(objects) == limit and not q:
+        next_cursor = encode_cursor(objects[-1]["price"], objects[-1]["id"])
+
+    # Anonymous result pages are shared and can sit briefly in the CDN;
+    # pages with is_favorite flags belong to one user only.
+    cache_control = "private, no-cache" if token else "public, max-age=30, must-revalidate"
+    response = etag_response(request, {
+        "total": total,
+        "objects": objects,
+        "next_cursor": next_cursor
+    }, cache_control=cache_control)
+    response.headers["Vary"] = SEARCH_VARY
+    return response
@@ -1,10 +1,19 @@
+import json
+
 from attrs import define
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Double
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Double, Index, delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 from typing import Optional
 
+from .cache import TTLCache
 from .database import Base
-from .schemas import AdEdit, AdResponse
+from .full_text import apply_full_text
+from .geo import apply_bbox, geohash_encode, geohash_precision_for_zoom, radius_bbox, within_radius
+from .jobs import enqueue
+from .ownership import WriteResult, owned_write
+from .schemas import AdEdit
+from .stats import ad_price_stats, summarize_histogram
 
 
 class Ad(Base):
@@ -18,6 +27,20 @@ class Ad(Base):
     rooms_count = Column(Integer)
     description = Column(String)
     owner_id = Column(Integer)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    latitude = Column(Double)
+    longitude = Column(Double)
+    geohash = Column(String(12), index=True)
+
+    __table_args__ = (
+        Index("ix_advertisements_type_rooms_count_price", "type", "rooms_count", "price"),
+        Index("ix_advertisements_price", "price"),
+        Index("ix_advertisements_owner_id", "owner_id"),
+        Index("ix_advertisements_address", "address"),
+        # Ids are never reused after a delete, so "ad-{id}-v{version}" ETags
+        # cannot match a different listing.
+        {"sqlite_autoincrement": True},
+    )
 
 
 @define
@@ -29,11 +52,13 @@ class AdCreate:
     rooms_count: int
     description: str
     owner_id: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 
 class AdsRepository:
-    def __init__(self):
-        self.favorites = []
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else TTLCache(ttl=30)
 
     def get_ad_by_id(self, db: Session, ad_id: int) -> Ad | None:
         return db.query(Ad).filter(Ad.id == ad_id).first()
@@ -41,6 +66,93 @@ class AdsRepository:
     def get_ad_by_address(self, db: Session, address: str) -> Ad | None:
         return db.query(Ad).filter(Ad.address == address).first()
 
+    def get_ad_owner(self, db: Session, ad_id: int) -> Row | None:
+        # Existence and ownership checks only need two columns; a Row skips
+        # the identity map and never loads the description.
+        return db.execute(select(Ad.id, Ad.owner_id).where(Ad.id == ad_id)).first()
+
+    def get_ad_detail(self, db: Session, ad_id: int) -> tuple[dict, int] | None:
+        # The per-ad version is read before the row, so a response built from
+        # data older than the last write lands under a stale key and is never
+        # served.
+        key = f"ad:{ad_id}:{self.cache.get_version(f'ad:{ad_id}')}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[0], cached[1]
+
+        db_ad = db.execute(
+            select(
+                Ad.id,
+                Ad.type,
+                Ad.price,
+                Ad.address,
+                Ad.area,
+                Ad.rooms_count,
+                Ad.description,
+                Ad.owner_id,
+                Ad.latitude,
+                Ad.longitude,
+                Ad.version
+            ).where(Ad.id == ad_id)
+        ).first()
+        if not db_ad:
+            return None
+
+        payload = {
+            "id": db_ad.id,
+            "type": db_ad.type,
+            "price": db_ad.price,
+            "address": db_ad.address,
+            "area": db_ad.area,
+            "rooms_count": db_ad.rooms_count,
+            "description": db_ad.description,
+            "user_id": db_ad.owner_id,
+            "latitude": db_ad.latitude,
+            "longitude": db_ad.longitude
+        }
+        self.cache.set(key, [payload, db_ad.version])
+        return payload, db_ad.version
+
+    def build_filters(
+        self,
+        type: Optional[str] = None,
+        rooms_count: Optional[int] = None,
+        price_from: Optional[int] = None,
+        price_until: Optional[int] = None
+    ) -> list:
+        # Only supplied parameters become predicates, so the planner can pick
+        # the matching composite index instead of scanning the whole table.
+        filters = []
+        if type is not None:
+            filters.append(Ad.type == type)
+        if rooms_count is not None:
+            filters.append(Ad.rooms_count == rooms_count)
+        if price_from is not None:
+            filters.append(Ad.price >= price_from)
+        if price_until is not None:
+            filters.append(Ad.price <= price_until)
+        return filters
+
+    def apply_location(
+        self,
+        query,
+        dialect: str,
+        bbox: Optional[tuple[float, float, float, float]] = None,
+        near: Optional[tuple[float, float, float]] = None
+    ):
+        if bbox is not None:
+            query = apply_bbox(query, dialect, Ad.id, Ad.latitude, Ad.longitude, bbox)
+
+        if near is not None:
+            latitude, longitude, radius_km = near
+            if bbox is None:
+                # The radius' bounding box goes through the spatial index;
+                # only the rows inside it pay for the distance check.
+                query = apply_bbox(query, dialect, Ad.id, Ad.latitude, Ad.longitude, radius_bbox(latitude, longitude, radius_km))
+            query = query.filter(within_radius(Ad.latitude, Ad.longitude, latitude, longitude, radius_km))
+
+        return query
+
     def get_ads(
         self, 
         db: Session, 
@@ -49,17 +161,232 @@ class AdsRepository:
         type: Optional[str] = None,
         rooms_count: Optional[int] = None,
         price_from: Optional[int] = None,
+        price_until: Optional[int] = None,
+        after: Optional[tuple[int, int]] = None,
+        q: Optional[str] = None,
+        bbox: Optional[tuple[float, float, float, float]] = None,
+        near: Optional[tuple[float, float, float]] = None
+    ) -> list[dict]:
+        # Selects only the response columns and returns plain dicts, so a
+        # page never hydrates ORM objects, builds a model per row or reads
+        # the description.
+        statement = self.search_statement(
+            dialect=db.get_bind().dialect.name,
+            type=type,
+            rooms_count=rooms_count,
+            price_from=price_from,
+            price_until=price_until,
+            q=q,
+            bbox=bbox,
+            near=near
+        )
+
+        if not q and after is not None:
+            # Keyset pagination: seek past the last (price, id) seen instead of
+            # skipping rows, so deep pages cost the same as the first one.
+            # Relevance-ranked results only page by offset.
+            statement = statement.filter(tuple_(Ad.price, Ad.id) > tuple_(*after))
+        else:
+            statement = statement.offset(skip)
+
+        result = db.execute(statement.limit(limit)).mappings()
+
+        return [dict(row) for row in result]
+
+    def search_statement(
+        self,
+        dialect: str,
+        limit: Optional[int] = None,
+        type: Optional[str] = None,
+        rooms_count: Optional[int] = None,
+        price_from: Optional[int] = None,
+        price_until: Optional[int] = None,
+        q: Optional[str] = None,
+        bbox: Optional[tuple[float, float, float, float]] = None,
+        near: Optional[tuple[float, float, float]] = None
+    ):
+        filters = self.build_filters(
+            type=type,
+            rooms_count=rooms_count,
+            price_from=price_from,
+            price_until=price_until
+        )
+        statement = select(
+            Ad.id,
+            Ad.type,
+            Ad.price,
+            Ad.address,
+            Ad.area,
+            Ad.rooms_count,
+            Ad.latitude,
+            Ad.longitude
+        ).filter(*filters)
+        statement = self.apply_location(statement, dialect, bbox=bbox, near=near)
+
+        if q:
+            statement = apply_full_text(statement, dialect, Ad.id, q)
+        else:
+            statement = statement.order_by(Ad.price, Ad.id)
+
+        if limit is not None:
+            statement = statement.limit(limit)
+        return statement
+
+    def count_ads(
+        self,
+        db: Session,
+        type: Optional[str] = None,
+        rooms_count: Optional[int] = None,
+        price_from: Optional[int] = None,
+        price_until: Optional[int] = None,
+        q: Optional[str] = None,
+        bbox: Optional[tuple[float, float, float, float]] = None,
+        near: Optional[tuple[float, float, float]] = None
+    ) -> int:
+        filters = self.build_filters(
+            type=type,
+            rooms_count=rooms_count,
+            price_from=price_from,
+            price_until=price_until
+        )
+        query = self.apply_location(db.query(func.count(Ad.id)).filter(*filters), db.get_bind().dialect.name, bbox=bbox, near=near)
+        if q:
+            query = apply_full_text(query, db.get_bind().dialect.name, Ad.id, q, rank=False)
+        return query.scalar()
+
+    def search_ads(
+        self,
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        type: Optional[str] = None,
+        rooms_count: Optional[int] = None,
+        price_from: Optional[int] = None,
+        price_until: Optional[int] = None,
+        after: Optional[tuple[int, int]] = None,
+        q: Optional[str] = None,
+        bbox: Optional[tuple[float, float, float, float]] = None,
+        near: Optional[tuple[float, float, float]] = None
+    ) -> tuple[list[dict], int]:
+        if q:
+            after = None
+
+        params = json.dumps([
+            0 if after is not None else skip,
+            limit,
+            type,
+            rooms_count,
+            price_from,
+            price_until,
+            list(after) if after is not None else None,
+            q,
+            bbox,
+            near
+        ])
+        key = f"search:{self.cache.get_version('ads')}:{params}"
+
+        payload = self.cache.get(key)
+        if payload is None:
+            filters = {
+                "type": type,
+                "rooms_count": rooms_count,
+                "price_from": price_from,
+                "price_until": price_until,
+                "q": q,
+                "bbox": bbox,
+                "near": near
+            }
+            objects = self.get_ads(db=db, skip=skip, limit=limit, after=after, **filters)
+            total = self.count_ads(db=db, **filters)
+            payload = {"objects": objects, "total": total}
+            self.cache.set(key, payload)
+
+        # Copies, so per-request fields set by the caller never reach the
+        # cached page.
+        return [{**ad, "is_favorite": None, "comment_count": None} for ad in payload["objects"]], payload["total"]
+
+    def get_tiles(
+        self,
+        db: Session,
+        bbox: tuple[float, float, float, float],
+        zoom: int,
+        type: Optional[str] = None,
+        rooms_count: Optional[int] = None,
+        price_from: Optional[int] = None,
         price_until: Optional[int] = None
-    ) -> list[AdResponse]:
+    ) -> list[dict]:
+        params = json.dumps([bbox, zoom, type, rooms_count, price_from, price_until])
+        key = f"tiles:{self.cache.get_version('ads')}:{params}"
+
+        cells = self.cache.get(key)
+        if cells is not None:
+            return cells
+
+        precision = geohash_precision_for_zoom(zoom)
+        cell = func.substr(Ad.geohash, 1, precision)
+        filters = self.build_filters(
+            type=type,
+            rooms_count=rooms_count,
+            price_from=price_from,
+            price_until=price_until
+        )
+        query = db.query(
+            cell.label("geohash"),
+            func.count(Ad.id).label("count"),
+            func.avg(Ad.latitude).label("latitude"),
+            func.avg(Ad.longitude).label("longitude")
+        ).filter(*filters)
+        query = self.apply_location(query, db.get_bind().dialect.name, bbox=bbox).group_by(cell)
+
+        cells = [
+            {"geohash": row.geohash, "count": row.count, "latitude": row.latitude, "longitude": row.longitude}
+            for row in query.all()
+        ]
+        self.cache.set(key, cells)
+        return cells
+
+    def get_stats(self, db: Session, type: Optional[str] = None, rooms_count: Optional[int] = None) -> dict:
+        # Reads the trigger-maintained histograms, never advertisements, so
+        # the cost grows with the number of price buckets and not of ads.
+        key = f"stats:{self.cache.get_version('ads')}:{json.dumps([type, rooms_count])}"
+        stats = self.cache.get(key)
+        if stats is not None:
+            return stats
 
-        result = db.query(Ad).filter(
-            type == None or Ad.type == type,
-            rooms_count == None or Ad.rooms_count == rooms_count,
-            price_from == None or Ad.price >= price_from,
-            price_until == None or Ad.price <= price_until 
-        ).offset(skip).limit(limit).all()
+        query = select(
+            ad_price_stats.c.type,
+            ad_price_stats.c.rooms_count,
+            ad_price_stats.c.bucket,
+            ad_price_stats.c.count,
+            ad_price_stats.c.price_sum
+        ).where(ad_price_stats.c.count > 0)
+        if type is not None:
+            query = query.where(ad_price_stats.c.type == type)
+        if rooms_count is not None:
+            query = query.where(ad_price_stats.c.rooms_count == rooms_count)
+        rows = db.execute(query.order_by(ad_price_stats.c.type, ad_price_stats.c.rooms_count, ad_price_stats.c.bucket)).all()
 
-        return list(map(lambda ad: AdResponse(id = ad.id, type = ad.type, price = ad.price, address = ad.address, area = ad.area, rooms_count = ad.rooms_count), result))
+        groups = {}
+        overall = {}
+        for row in rows:
+            groups.setdefault((row.type, row.rooms_count), []).append((row.bucket, row.count, row.price_sum))
+            count, price_sum = overall.get(row.bucket, (0, 0))
+            overall[row.bucket] = (count + row.count, price_sum + row.price_sum)
+
+        stats = {
+            "groups": [
+                {"type": group_type, "rooms_count": group_rooms_count, **summarize_histogram(histogram)}
+                for (group_type, group_rooms_count), histogram in groups.items()
+            ],
+            "total": summarize_histogram([(bucket, *overall[bucket]) for bucket in sorted(overall)])
+        }
+        self.cache.set(key, stats)
+        return stats
+
+    def invalidate_ad(self, ad_id: Optional[int] = None):
+        if ad_id is not None:
+            self.cache.bump_version(f"ad:{ad_id}")
+        self.cache.bump_version("ads")
 
     def create_ad(self, db: Session, ad: AdCreate) -> Ad:
         db_ad = Ad(
@@ -69,39 +396,107 @@ class AdsRepository:
             area=ad.area, 
             rooms_count=ad.rooms_count, 
             description=ad.description,
-            owner_id=ad.owner_id
+            owner_id=ad.owner_id,
+            latitude=ad.latitude,
+            longitude=ad.longitude,
+            geohash=geohash_encode(ad.latitude, ad.longitude) if ad.latitude is not None and ad.longitude is not None else None
         )
         db.add(db_ad)
+        db.flush()
+        enqueue(db, "ad_created", {"ad_id": db_ad.id})
         db.commit()
         db.refresh(db_ad)
+        self.invalidate_ad()
         return db_ad
 
-    def update_ad(self, db: Session, ad_id: int, new_data: AdEdit) -> Ad:
-        db_ad = db.query(Ad).filter(Ad.id == ad_id).update({
-            Ad.type: new_data.type, 
-            Ad.price: new_data.price, 
-            Ad.address: new_data.address,
-            Ad.area: new_data.area,
-            Ad.rooms_count: new_data.rooms_count,
-            Ad.description: new_data.description
-        })
-        db.flush()
-        db.commit()
+    def get_existing_addresses(self, db: Session, addresses: list[str]) -> set[str]:
+        if not addresses:
+            return set()
 
-    def delete_ad_by_id(self, db: Session, ad_id: int):
-        db_ad = db.query(Ad).filter(Ad.id == ad_id).delete()
-        db.flush()
+        return set(db.execute(select(Ad.address).where(Ad.address.in_(addresses))).scalars())
+
+    def bulk_create_ads(self, db: Session, ads: list[AdCreate]) -> int:
+        if not ads:
+            return 0
+
+        db.execute(insert(Ad), [
+            {
+                "type": ad.type,
+                "price": ad.price,
+                "address": ad.address,
+                "area": ad.area,
+                "rooms_count": ad.rooms_count,
+                "description": ad.description,
+                "owner_id": ad.owner_id,
+                "latitude": ad.latitude,
+                "longitude": ad.longitude,
+                "geohash": geohash_encode(ad.latitude, ad.longitude) if ad.latitude is not None and ad.longitude is not None else None
+            }
+            for ad in ads
+        ])
         db.commit()
+        self.invalidate_ad()
+        return len(ads)
 
-    def add_to_favorite_list(self, db: Session, ad_id: int):
-        db_ad = db.query(Ad).filter(Ad.id == ad_id).first()
-        ad = {"id": db_ad.id, "address": db_ad.address}
-        self.favorites.append(ad)
-    
-    def get_all_favorites(self):
-        return self.favorites
-
-    def delete_favorite_ad_by_id(self, ad_id: int):
-        for i, ad in enumerate(self.favorites):
-            if ad["id"] == ad_id:
-                del self.favorites[i]
+    def get_ads_after_id(
+        self,
+        db: Session,
+        after_id: int = 0,
+        limit: int = 1000,
+        owner_id: Optional[int] = None
+    ) -> list[dict]:
+        query = select(
+            Ad.id,
+            Ad.type,
+            Ad.price,
+            Ad.address,
+            Ad.area,
+            Ad.rooms_count,
+            Ad.description,
+            Ad.owner_id,
+            Ad.latitude,
+            Ad.longitude
+        ).where(Ad.id > after_id)
+        if owner_id is not None:
+            query = query.where(Ad.owner_id == owner_id)
+
+        result = db.execute(query.order_by(Ad.id).limit(limit))
+        return [dict(row._mapping) for row in result]
+
+    def update_ad(self, db: Session, ad_id: int, owner_id: int, new_data: AdEdit) -> WriteResult:
+        # Only fields the client sent are written, and only when one of them
+        # differs from the stored row, so a price change never rewrites the
+        # address or fires the full-text and spatial index triggers.
+        changes = {getattr(Ad, field): value for field, value in new_data.model_dump(exclude_unset=True, exclude_none=True).items()}
+        if Ad.latitude in changes:
+            changes[Ad.geohash] = geohash_encode(changes[Ad.latitude], changes[Ad.longitude])
+
+        statement = None
+        if changes:
+            statement = update(Ad).where(
+                Ad.id == ad_id,
+                Ad.owner_id == owner_id,
+                or_(*(column.is_distinct_from(value) for column, value in changes.items()))
+            ).values({**changes, Ad.version: Ad.version + 1})
+
+        result = owned_write(
+            db,
+            statement,
+            Ad.id,
+            [(WriteResult.NOT_FOUND, select(Ad.id).where(Ad.id == ad_id))],
+            owned=select(Ad.id).where(Ad.id == ad_id, Ad.owner_id == owner_id)
+        )
+        if result is WriteResult.DONE:
+            self.invalidate_ad(ad_id)
+        return result
+
+    def delete_ad_by_id(self, db: Session, ad_id: int, owner_id: int) -> WriteResult:
+        result = owned_write(
+            db,
+            delete(Ad).where(Ad.id == ad_id, Ad.owner_id == owner_id),
+            Ad.id,
+            [(WriteResult.NOT_FOUND, select(Ad.id).where(Ad.id == ad_id))]
+        )
+        if result is WriteResult.DONE:
+            self.invalidate_ad(ad_id)
+        return result
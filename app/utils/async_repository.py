@@ -0,0 +1,26 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+
+class AsyncRepository:
+    # Async sessions run the sync repository code via run_sync on the async
+    # driver; plain sessions (sync mode) are pushed to the threadpool.
+
+    def __init__(self, repository):
+        self.repository = repository
+
+    def __getattr__(self, name: str):
+        method = getattr(self.repository, name)
+
+        async def call(*args, **kwargs):
+            db = kwargs.pop("db", None)
+
+            if isinstance(db, AsyncSession):
+                return await db.run_sync(lambda session: method(*args, db=session, **kwargs))
+
+            if db is not None:
+                kwargs["db"] = db
+
+            return await run_in_threadpool(method, *args, **kwargs)
+
+        return call
@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+from typing import AsyncIterator
+
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+
+EXPORT_FIELDS = [
+    "id",
+    "type",
+    "price",
+    "address",
+    "area",
+    "rooms_count",
+    "description",
+    "owner_id",
+    "latitude",
+    "longitude",
+]
+
+INVALID_UTF8 = "Invalid UTF-8"
+
+
+def decode_line(line: bytes) -> str | None:
+    # None marks a line that is not valid UTF-8, reported as a row error.
+    try:
+        return line.decode("utf-8").rstrip("\r")
+    except UnicodeDecodeError:
+        return None
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str | None]:
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield decode_line(line)
+
+    if buffer:
+        yield decode_line(buffer)
+
+
+async def iter_records(stream: AsyncIterator[bytes], format: str) -> AsyncIterator[tuple[int, dict | str]]:
+    # Yields (line number, row) pairs; a row that cannot be parsed is yielded
+    # as its error message so the caller can report it and carry on.
+    if format == "csv":
+        header = None
+        record, start = "", 0
+        line_number = 0
+        async for line in iter_lines(stream):
+            line_number += 1
+            if line is None:
+                # Drops the record it belongs to, which may span lines.
+                yield (start if record else line_number), INVALID_UTF8
+                record = ""
+                continue
+            if not record:
+                start = line_number
+            record = f"{record}\n{line}" if record else line
+
+            # Quotes inside fields are doubled, so an odd count means the
+            # record continues on the next physical line.
+            if record.count('"') % 2:
+                continue
+
+            if not record.strip():
+                record = ""
+                continue
+
+            values = next(csv.reader([record]))
+            record = ""
+            if header is None:
+                header = values
+                continue
+
+            if len(values) != len(header):
+                yield start, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+
+            yield start, {key: (value if value != "" else None) for key, value in zip(header, values)}
+        return
+
+    line_number = 0
+    async for line in iter_lines(stream):
+        line_number += 1
+        if line is None:
+            yield line_number, INVALID_UTF8
+            continue
+        if not line.strip():
+            continue
+
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+
+        if not isinstance(row, dict):
+            yield line_number, "Expected a JSON object"
+            continue
+
+        yield line_number, row
+
+
+def encode_ndjson(rows) -> bytes:
+    return b"".join(orjson.dumps(dict(row)) + b"\n" for row in rows)
+
+
+def encode_csv(rows, header: bool = False, fields: list[str] = EXPORT_FIELDS) -> bytes:
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=fields, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue().encode()
+
+
+def stream_rows(db: Session | AsyncSession, statement, format: str, batch_size: int = 1000):
+    # Rows come off a server-side cursor one partition at a time and are
+    # encoded straight away, so memory stays flat however many rows match.
+    statement = statement.execution_options(stream_results=True, yield_per=batch_size)
+    fields = [column.name for column in statement.selected_columns]
+
+    def encode(partition, first: bool) -> bytes:
+        if format == "csv":
+            return encode_csv(partition, header=first, fields=fields)
+        return encode_ndjson(partition)
+
+    if isinstance(db, AsyncSession):
+        async def content():
+            result = await db.stream(statement)
+            first = True
+            async for partition in result.mappings().partitions():
+                yield encode(partition, first)
+                first = False
+            if first and format == "csv":
+                yield encode([], True)
+
+        return content()
+
+    # A plain generator: Starlette iterates it in the threadpool.
+    def content():
+        first = True
+        for partition in db.execute(statement).mappings().partitions():
+            yield encode(partition, first)
+            first = False
+        if first and format == "csv":
+            yield encode([], True)
+
+    return content()
@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import CACHE_ENTRIES, CACHE_EVICTIONS, CACHE_REQUESTS
+
+
+logger = logging.getLogger("saniraq.cache")
+
+
+# Versions are dropped after version_ttl without a read or bump, which is
+# safe because every entry cached under a version was set right after reading
+# it and expires first; a dropped version starts again from 0. The default of
+# twice the entry TTL leaves room for the query between the read and the set.
+VERSION_TTL_FACTOR = 2
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60, name: str = "default", version_ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version_ttl = ttl * VERSION_TTL_FACTOR if version_ttl is None else version_ttl
+        self.data = OrderedDict()
+        # name -> (version, expires_at), least recently used first.
+        self.versions = OrderedDict()
+        self.lock = threading.Lock()
+        # Exported on /metrics, labelled by cache name.
+        self.hits = CACHE_REQUESTS.labels(name, "hit")
+        self.misses = CACHE_REQUESTS.labels(name, "miss")
+        self.evictions = CACHE_EVICTIONS.labels(name)
+        self.entries = CACHE_ENTRIES.labels(name)
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                self.misses.inc()
+                return None
+
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self.data[key]
+                self.misses.inc()
+                self.evictions.inc()
+                self.entries.set(len(self.data))
+                return None
+
+            self.data.move_to_end(key)
+            self.hits.inc()
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions.inc()
+            self.entries.set(len(self.data))
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+            self.entries.set(len(self.data))
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.entries.set(0)
+
+    # Versions live outside the LRU: evicting one while entries cached under
+    # it are still fresh would let older ones be served again. They expire by
+    # time instead (see VERSION_TTL_FACTOR), so edited ads do not pile up.
+    def get_version(self, name: str) -> int:
+        with self.lock:
+            self.expire_versions()
+            if name not in self.versions:
+                return 0
+            return self.touch_version(name, self.versions[name][0])
+
+    def bump_version(self, name: str) -> int:
+        with self.lock:
+            self.expire_versions()
+            version = self.versions[name][0] + 1 if name in self.versions else 1
+            return self.touch_version(name, version)
+
+    def touch_version(self, name: str, version: int) -> int:
+        self.versions[name] = (version, time.monotonic() + self.version_ttl)
+        self.versions.move_to_end(name)
+        return version
+
+    def expire_versions(self):
+        now = time.monotonic()
+        while self.versions:
+            name, (_, expires_at) = next(iter(self.versions.items()))
+            if expires_at > now:
+                break
+            del self.versions[name]
+
+
+class RedisCache:
+    # Works with any client speaking the sync redis-py API (get/set/delete/
+    # incr), so fakeredis can stand in for a server in tests. Repositories
+    # call the cache from sync code, so this is meant for the default sync
+    # mode, where that code runs in the threadpool; see create_cache.
+    # Evictions happen server-side and show up in Redis' own INFO stats.
+    def __init__(self, client, ttl: float = 60, prefix: str = "saniraq:", name: str = "default", version_ttl: float | None = None):
+        self.client = client
+        self.ttl = ttl
+        self.version_ttl = max(1, int(ttl * VERSION_TTL_FACTOR if version_ttl is None else version_ttl))
+        self.prefix = prefix
+        self.hits = CACHE_REQUESTS.labels(name, "hit")
+        self.misses = CACHE_REQUESTS.labels(name, "miss")
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses.inc()
+            return None
+
+        self.hits.inc()
+        return json.loads(raw)
+
+    def set(self, key, value, ttl: float | None = None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(self.ttl if ttl is None else ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    # Version keys expire like TTLCache's versions: every read and bump
+    # pushes the expiry out (GETEX needs Redis 6.2).
+    def get_version(self, name: str) -> int:
+        version = self.client.getex(self.prefix + "version:" + name, ex=self.version_ttl)
+        return int(version) if version is not None else 0
+
+    def bump_version(self, name: str) -> int:
+        key = self.prefix + "version:" + name
+        pipeline = self.client.pipeline()
+        pipeline.incr(key)
+        pipeline.expire(key, self.version_ttl)
+        version, _ = pipeline.execute()
+        return version
+
+
+def create_cache(name: str = "default", async_database: bool = False):
+    backend = os.getenv("CACHE_BACKEND", "memory")
+    ttl = float(os.getenv("CACHE_TTL", "30"))
+
+    if backend == "redis":
+        import redis
+
+        # With USE_ASYNC_DATABASE the repositories run on the event loop
+        # thread (AsyncSession.run_sync), so every blocking Redis round trip
+        # stalls all requests; the Redis backend is supported in sync mode only.
+        if async_database:
+            logger.warning("CACHE_BACKEND=redis blocks the event loop with USE_ASYNC_DATABASE=true; use it in sync mode only")
+
+        client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        return RedisCache(client=client, ttl=ttl, name=name)
+
+    return TTLCache(maxsize=int(os.getenv("CACHE_MAX_SIZE", "10000")), ttl=ttl, name=name)
@@ -1,9 +1,17 @@
+import hashlib
+
 from attrs import define
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Double, DateTime
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Double, DateTime, Index, delete, func, or_, select, tuple_, update
 from sqlalchemy.orm import Session
 
+from .ads_repository import Ad
 from .database import Base
+from .jobs import enqueue
+from .ownership import WriteResult, owned_write
 from .schemas import CommentEdit
+from .users_repository import User
 
 
 class Comment(Base):
@@ -15,12 +23,23 @@ class Comment(Base):
     edited = Column(Boolean, default=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
     ad_id = Column(Integer, ForeignKey("advertisements.id"))
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    content_hash = Column(String(64))
+
+    __table_args__ = (
+        Index("ix_comments_ad_id_created_at_id", "ad_id", "created_at", "id"),
+        Index("ix_comments_ad_id_owner_id_content_hash", "ad_id", "owner_id", "content_hash", "created_at"),
+    )
+
+
+def hash_content(content: str) -> str:
+    return hashlib.sha256(content.strip().encode()).hexdigest()
 
 
 @define
 class CommentCreate:
     content: str
-    created_at: int
+    created_at: datetime
     edited: bool
     owner_id: int
     ad_id: int
@@ -33,8 +52,75 @@ class CommentsRepository:
     def get_comments_by_ad_id(self, db: Session, ad_id:int) -> list[Comment] | None:
         return db.query(Comment).filter(Comment.ad_id == ad_id).all()
 
-    def get_comment_by_content(self, db: Session, content: str) -> Comment | None:
-        return db.query(Comment).filter(Comment.content == content).first()
+    def get_comments_page(
+        self,
+        db: Session,
+        ad_id: int,
+        limit: int = 20,
+        after: Optional[tuple[datetime, int]] = None,
+        with_author: bool = False
+    ) -> list[dict]:
+        columns = [
+            Comment.id,
+            Comment.content,
+            Comment.created_at,
+            Comment.edited,
+            Comment.owner_id,
+            Comment.ad_id
+        ]
+        if with_author:
+            columns += [User.name.label("author_name"), User.city.label("author_city")]
+
+        query = select(*columns).where(Comment.ad_id == ad_id)
+        if with_author:
+            query = query.outerjoin(User, User.id == Comment.owner_id)
+        if after is not None:
+            query = query.where(tuple_(Comment.created_at, Comment.id) > tuple_(*after))
+
+        result = db.execute(query.order_by(Comment.created_at, Comment.id).limit(limit)).all()
+
+        comments = []
+        for row in result:
+            comment = {
+                "id": row.id,
+                "content": row.content,
+                "created_at": row.created_at,
+                "edited": row.edited,
+                "owner_id": row.owner_id,
+                "ad_id": row.ad_id
+            }
+            if with_author:
+                comment["author"] = {"name": row.author_name, "city": row.author_city}
+            comments.append(comment)
+
+        return comments
+
+    def count_comments_by_ad_ids(self, db: Session, ad_ids: list[int]) -> dict[int, int]:
+        if not ad_ids:
+            return {}
+
+        result = db.execute(
+            select(Comment.ad_id, func.count(Comment.id))
+            .where(Comment.ad_id.in_(ad_ids))
+            .group_by(Comment.ad_id)
+        ).all()
+
+        return {ad_id: count for ad_id, count in result}
+
+    def get_recent_duplicate(
+        self,
+        db: Session,
+        ad_id: int,
+        owner_id: int,
+        content: str,
+        window: timedelta = timedelta(minutes=10)
+    ) -> Comment | None:
+        return db.query(Comment).filter(
+            Comment.ad_id == ad_id,
+            Comment.owner_id == owner_id,
+            Comment.content_hash == hash_content(content),
+            Comment.created_at >= datetime.now() - window
+        ).first()
 
     def get_comments(self, db: Session, skip: int = 0, limit: int = 100) -> list[Comment]:
         return db.query(Comment).offset(skip).limit(limit).all()
@@ -42,20 +128,56 @@ class CommentsRepository:
     def create_comment(self, db: Session, comment: CommentCreate) -> Comment:
         db_comment = Comment(
             content=comment.content,
+            content_hash=hash_content(comment.content),
+            created_at=comment.created_at,
+            edited=comment.edited,
             owner_id=comment.owner_id,
             ad_id=comment.ad_id
         )
         db.add(db_comment)
+        db.flush()
+        enqueue(db, "comment_created", {"comment_id": db_comment.id, "ad_id": db_comment.ad_id})
         db.commit()
         db.refresh(db_comment)
         return db_comment
 
-    def update_comment(self, db: Session, comment_id: int, new_data: CommentEdit) -> Comment:
-        db_comment = db.query(Comment).filter(Comment.id == comment_id).update({Comment.content: new_data.content, Comment.edited: True})
-        db.flush()
-        db.commit()
+    def update_comment(self, db: Session, ad_id: int, comment_id: int, owner_id: int, new_data: CommentEdit) -> WriteResult:
+        return owned_write(
+            db,
+            update(Comment)
+            .where(
+                Comment.id == comment_id,
+                Comment.ad_id == ad_id,
+                Comment.owner_id == owner_id,
+                Comment.content.is_distinct_from(new_data.content)
+            )
+            .values({
+                Comment.content: new_data.content,
+                Comment.content_hash: hash_content(new_data.content),
+                Comment.edited: True,
+                Comment.version: Comment.version + 1
+            }),
+            Comment.id,
+            self.comment_lookups(ad_id=ad_id, comment_id=comment_id),
+            owned=select(Comment.id).where(Comment.id == comment_id, Comment.ad_id == ad_id, Comment.owner_id == owner_id)
+        )
 
-    def delete_comment_by_id(self, db: Session, comment_id: int):
-        db_comment = db.query(Comment).filter(Comment.id == comment_id).delete()
-        db.flush()
-        db.commit()
+    def delete_comment_by_id(self, db: Session, ad_id: int, comment_id: int, user_id: int) -> WriteResult:
+        # Either the comment's author or the ad's owner may delete it.
+        ad_owned = select(Ad.id).where(Ad.id == Comment.ad_id, Ad.owner_id == user_id).exists()
+        return owned_write(
+            db,
+            delete(Comment).where(
+                Comment.id == comment_id,
+                Comment.ad_id == ad_id,
+                or_(Comment.owner_id == user_id, ad_owned)
+            ),
+            Comment.id,
+            self.comment_lookups(ad_id=ad_id, comment_id=comment_id)
+        )
+
+    def comment_lookups(self, ad_id: int, comment_id: int) -> list:
+        return [
+            (WriteResult.PARENT_NOT_FOUND, select(Ad.id).where(Ad.id == ad_id)),
+            (WriteResult.NOT_FOUND, select(Comment.id).where(Comment.id == comment_id, Comment.ad_id == ad_id)),
+        ]
@@ -1,12 +1,96 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+
+# Railway and Heroku hand out postgres:// URLs, which SQLAlchemy 2 rejects.
+if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
+    SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+USE_ASYNC_DATABASE = env_flag("USE_ASYNC_DATABASE")
+
+POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = env_flag("DATABASE_POOL_PRE_PING", "true")
+STATEMENT_TIMEOUT_MS = int(os.getenv("DATABASE_STATEMENT_TIMEOUT_MS", "5000"))
+
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+url = make_url(SQLALCHEMY_DATABASE_URL)
+is_sqlite = url.get_backend_name() == "sqlite"
+
+
+def engine_options(async_driver: bool) -> dict:
+    options = {
+        "pool_pre_ping": POOL_PRE_PING,
+        "pool_recycle": POOL_RECYCLE,
+    }
+
+    if is_sqlite:
+        # SQLite enforces its own lock wait rather than a statement timeout;
+        # use the same budget for busy_timeout instead of failing instantly
+        # with "database is locked".
+        connect_args = {"timeout": STATEMENT_TIMEOUT_MS / 1000}
+        if not async_driver:
+            connect_args["check_same_thread"] = False
+        options["connect_args"] = connect_args
+
+        if url.database in (None, "", ":memory:"):
+            return options
+    elif async_driver:
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(STATEMENT_TIMEOUT_MS)}}
+    else:
+        options["connect_args"] = {"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"}
+
+    options["pool_size"] = POOL_SIZE
+    options["max_overflow"] = MAX_OVERFLOW
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.close()
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(async_driver=False))
+if is_sqlite:
+    event.listen(engine, "connect", set_sqlite_pragmas)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+async_engine = None
+AsyncSessionLocal = None
+
+if USE_ASYNC_DATABASE:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    async_engine = create_async_engine(async_url, **engine_options(async_driver=True))
+    if is_sqlite:
+        event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False
+    )
+
+Base = declarative_base()
@@ -0,0 +1,46 @@
+import hashlib
+
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so a W/ prefix from an
+    # intermediary still matches our strong tag.
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def etag_response(
+    request: Request,
+    payload,
+    version_tag: str | None = None,
+    cache_control: str = "private, no-cache"
+) -> Response:
+    headers = {"Cache-Control": cache_control}
+
+    # A row-version tag is known before serialization, so a match skips
+    # encoding the body entirely.
+    if version_tag is not None:
+        etag = f'"{version_tag}"'
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    # Payloads are plain dicts and lists built from projected rows, which
+    # orjson encodes directly without a jsonable_encoder pass.
+    response = ORJSONResponse(payload, headers=headers)
+
+    if version_tag is None:
+        etag = f'"{hashlib.sha1(response.body).hexdigest()}"'
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    response.headers["ETag"] = etag
+    return response
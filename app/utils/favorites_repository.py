@@ -0,0 +1,53 @@
+from sqlalchemy import Column, ForeignKey, Integer, delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .ads_repository import Ad
+from .database import Base
+
+
+class Favorite(Base):
+    __tablename__ = "favorites"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ad_id = Column(Integer, ForeignKey("advertisements.id", ondelete="CASCADE"), primary_key=True)
+
+
+class FavoritesRepository:
+    def add_favorite(self, db: Session, user_id: int, ad_id: int) -> bool:
+        # One statement, so two concurrent adds of the same favorite cannot
+        # both pass a lookup and then collide on the primary key.
+        dialect = db.get_bind().dialect.name
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        result = db.execute(
+            insert(Favorite).values(user_id=user_id, ad_id=ad_id).on_conflict_do_nothing()
+        )
+        db.commit()
+        return result.rowcount > 0
+
+    def get_favorites(self, db: Session, user_id: int) -> list[dict]:
+        result = db.execute(
+            select(Ad.id, Ad.address)
+            .join(Favorite, Favorite.ad_id == Ad.id)
+            .where(Favorite.user_id == user_id)
+            .order_by(Favorite.ad_id)
+        ).all()
+
+        return [{"id": row.id, "address": row.address} for row in result]
+
+    def get_favorite_ad_ids(self, db: Session, user_id: int, ad_ids: list[int]) -> set[int]:
+        if not ad_ids:
+            return set()
+
+        result = db.execute(
+            select(Favorite.ad_id).where(Favorite.user_id == user_id, Favorite.ad_id.in_(ad_ids))
+        ).scalars()
+
+        return set(result)
+
+    def delete_favorite(self, db: Session, user_id: int, ad_id: int) -> bool:
+        result = db.execute(
+            delete(Favorite).where(Favorite.user_id == user_id, Favorite.ad_id == ad_id)
+        )
+        db.commit()
+        return result.rowcount > 0
@@ -0,0 +1,109 @@
+import re
+
+from sqlalchemy import false, func, inspect, literal_column, table, column, text
+from sqlalchemy.engine import Connection
+
+
+# SQLite keeps an external-content FTS5 table over advertisements; Postgres a
+# generated tsvector column with a GIN index. Both are maintained by the
+# database itself, so every insert, update and delete of an ad (including
+# bulk statements) keeps the index in sync.
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS ads_fts USING fts5(
+        address, description,
+        content='advertisements', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ads_fts_insert AFTER INSERT ON advertisements BEGIN
+        INSERT INTO ads_fts(rowid, address, description) VALUES (new.id, new.address, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ads_fts_delete AFTER DELETE ON advertisements BEGIN
+        INSERT INTO ads_fts(ads_fts, rowid, address, description) VALUES ('delete', old.id, old.address, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ads_fts_update AFTER UPDATE OF address, description ON advertisements BEGIN
+        INSERT INTO ads_fts(ads_fts, rowid, address, description) VALUES ('delete', old.id, old.address, old.description);
+        INSERT INTO ads_fts(rowid, address, description) VALUES (new.id, new.address, new.description);
+    END
+    """,
+]
+
+POSTGRES_DDL = [
+    """
+    ALTER TABLE advertisements ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('simple', coalesce(address, '') || ' ' || coalesce(description, ''))
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_advertisements_search_vector ON advertisements USING GIN (search_vector)",
+]
+
+# Even a no-op ALTER TABLE takes an ACCESS EXCLUSIVE lock, so Postgres only
+# runs the DDL when the index (and so its column) is missing.
+POSTGRES_INSTALLED = "SELECT to_regclass('ix_advertisements_search_vector') IS NOT NULL"
+
+ads_fts = table("ads_fts", column("rowid"))
+
+
+def ensure_full_text_index(connection: Connection):
+    dialect = connection.dialect.name
+
+    if dialect == "postgresql":
+        if connection.execute(text(POSTGRES_INSTALLED)).scalar():
+            return
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+    elif dialect == "sqlite":
+        exists = inspect(connection).has_table("ads_fts")
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text("INSERT INTO ads_fts(ads_fts) VALUES ('rebuild')"))
+
+
+def drop_full_text_index(connection: Connection):
+    dialect = connection.dialect.name
+
+    if dialect == "postgresql":
+        connection.execute(text("DROP INDEX IF EXISTS ix_advertisements_search_vector"))
+        connection.execute(text("ALTER TABLE advertisements DROP COLUMN IF EXISTS search_vector"))
+    elif dialect == "sqlite":
+        for trigger in ("ads_fts_insert", "ads_fts_delete", "ads_fts_update"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        connection.execute(text("DROP TABLE IF EXISTS ads_fts"))
+
+
+def fts5_query(q: str) -> str | None:
+    # Quote every term so user input can never be parsed as FTS5 syntax, and
+    # prefix-match it so partial street names still hit.
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def apply_full_text(query, dialect: str, id_column, q: str, rank: bool = True):
+    if dialect == "postgresql":
+        vector = literal_column("advertisements.search_vector")
+        tsquery = func.plainto_tsquery("simple", q)
+        query = query.filter(vector.op("@@")(tsquery))
+        if rank:
+            query = query.order_by(func.ts_rank(vector, tsquery).desc(), id_column)
+        return query
+
+    match = fts5_query(q)
+    if match is None:
+        return query.filter(false())
+
+    query = query.join(ads_fts, ads_fts.c.rowid == id_column).filter(
+        literal_column("ads_fts").op("MATCH")(match)
+    )
+    if rank:
+        query = query.order_by(func.bm25(literal_column("ads_fts")), id_column)
+    return query
@@ -0,0 +1,152 @@
+import math
+
+from sqlalchemy import column, func, inspect, table, text
+from sqlalchemy.engine import Connection
+
+
+KM_PER_DEGREE = 111.32
+# Zooms 0-28 map onto geohash precisions 1-12 (geohash_precision_for_zoom);
+# radius searches beyond MAX_RADIUS_KM should use a bounding box instead.
+MIN_ZOOM, MAX_ZOOM = 0, 28
+MAX_RADIUS_KM = 500
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# SQLite keeps an R-tree over (latitude, longitude) maintained by triggers;
+# Postgres a GiST index on the built-in point type, so no PostGIS is needed.
+# Other backends fall back to plain range predicates on the columns.
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS ads_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    """
+    CREATE TRIGGER IF NOT EXISTS ads_rtree_insert AFTER INSERT ON advertisements
+    WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+        INSERT INTO ads_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ads_rtree_delete AFTER DELETE ON advertisements BEGIN
+        DELETE FROM ads_rtree WHERE id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ads_rtree_update AFTER UPDATE OF latitude, longitude ON advertisements BEGIN
+        DELETE FROM ads_rtree WHERE id = old.id;
+        INSERT INTO ads_rtree SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+    END
+    """,
+]
+
+POSTGRES_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_advertisements_location ON advertisements USING GIST (point(longitude, latitude))",
+]
+
+# Checked first, so a boot against an indexed table takes no lock on it.
+POSTGRES_INSTALLED = "SELECT to_regclass('ix_advertisements_location') IS NOT NULL"
+
+ads_rtree = table(
+    "ads_rtree",
+    column("id"),
+    column("min_lat"),
+    column("max_lat"),
+    column("min_lng"),
+    column("max_lng"),
+)
+
+
+def ensure_spatial_index(connection: Connection):
+    dialect = connection.dialect.name
+
+    if dialect == "postgresql":
+        if connection.execute(text(POSTGRES_INSTALLED)).scalar():
+            return
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+    elif dialect == "sqlite":
+        exists = inspect(connection).has_table("ads_rtree")
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text(
+                "INSERT INTO ads_rtree SELECT id, latitude, latitude, longitude, longitude "
+                "FROM advertisements WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+            ))
+
+
+def drop_spatial_index(connection: Connection):
+    dialect = connection.dialect.name
+
+    if dialect == "postgresql":
+        connection.execute(text("DROP INDEX IF EXISTS ix_advertisements_location"))
+    elif dialect == "sqlite":
+        for trigger in ("ads_rtree_insert", "ads_rtree_delete", "ads_rtree_update"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        connection.execute(text("DROP TABLE IF EXISTS ads_rtree"))
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 12) -> str:
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    result = []
+    bits, bit_count, even = 0, 0, True
+
+    while len(result) < precision:
+        value, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits = (bits << 1) | 1
+            bounds[0] = middle
+        else:
+            bits = bits << 1
+            bounds[1] = middle
+
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            result.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+
+    return "".join(result)
+
+
+def geohash_precision_for_zoom(zoom: int) -> int:
+    # A geohash of length p spans about 360 / 2**(2.5 * p) degrees of
+    # longitude; pick p so a 256px tile at this zoom holds a few cells.
+    return max(1, min(12, round((2 * zoom + 4) / 5)))
+
+
+def radius_bbox(latitude: float, longitude: float, radius_km: float) -> tuple[float, float, float, float]:
+    lat_delta = radius_km / KM_PER_DEGREE
+    lng_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+    return latitude - lat_delta, longitude - lng_delta, latitude + lat_delta, longitude + lng_delta
+
+
+def apply_bbox(query, dialect: str, id_column, latitude_column, longitude_column, bbox: tuple[float, float, float, float]):
+    min_lat, min_lng, max_lat, max_lng = bbox
+
+    if dialect == "sqlite":
+        # The R-tree stores 32-bit floats rounded outwards, so probe it with
+        # an overlap test and let the exact column check below settle edges.
+        query = query.join(ads_rtree, ads_rtree.c.id == id_column).filter(
+            ads_rtree.c.max_lat >= min_lat,
+            ads_rtree.c.min_lat <= max_lat,
+            ads_rtree.c.max_lng >= min_lng,
+            ads_rtree.c.min_lng <= max_lng,
+        )
+    elif dialect == "postgresql":
+        location = func.point(longitude_column, latitude_column)
+        area = func.box(func.point(min_lng, min_lat), func.point(max_lng, max_lat))
+        query = query.filter(location.op("<@")(area))
+
+    return query.filter(
+        latitude_column.between(min_lat, max_lat),
+        longitude_column.between(min_lng, max_lng),
+    )
+
+
+def within_radius(latitude_column, longitude_column, latitude: float, longitude: float, radius_km: float):
+    # Equirectangular distance: only arithmetic, so it runs on every backend,
+    # and accurate to well under 1% at city-scale radii.
+    lng_scale = math.cos(math.radians(latitude))
+    dy = (latitude_column - latitude) * KM_PER_DEGREE
+    dx = (longitude_column - longitude) * KM_PER_DEGREE * lng_scale
+    return dx * dx + dy * dy <= radius_km * radius_km
@@ -0,0 +1,311 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from attrs import define
+from sqlalchemy import Column, DateTime, Integer, String, Text, Index, delete, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .database import Base, env_flag
+from .metrics import JOB_DURATION, JOB_QUEUE_DEPTH, JOBS
+
+
+logger = logging.getLogger("saniraq.jobs")
+
+JOBS_ENABLED = env_flag("JOBS_ENABLED", "true")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "1000"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "1"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "300"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "100"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_DRAIN_SECONDS = float(os.getenv("JOB_DRAIN_SECONDS", "10"))
+
+
+class OutboxJob(Base):
+    __tablename__ = "job_outbox"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, nullable=False)
+    available_at = Column(DateTime, nullable=False)
+    failed_at = Column(DateTime)
+    last_error = Column(Text)
+
+    __table_args__ = (
+        Index("ix_job_outbox_failed_at_available_at", "failed_at", "available_at"),
+    )
+
+
+def enqueue(db: Session, name: str, payload: dict):
+    # Only adds the row: it is written by the caller's commit, together with
+    # the change that caused it, or not at all.
+    now = datetime.now()
+    db.add(OutboxJob(name=name, payload=json.dumps(payload), created_at=now, available_at=now))
+
+
+def backoff(attempts: int, base: float = JOB_BACKOFF_SECONDS, cap: float = JOB_BACKOFF_MAX_SECONDS) -> float:
+    # Exponential with full jitter, so jobs that failed together (a database
+    # restart, say) do not all retry in the same instant.
+    return random.uniform(0, min(cap, base * 2 ** (attempts - 1)))
+
+
+@define
+class Job:
+    name: str
+    payload: dict
+    attempts: int = 1
+    # Set for jobs claimed from the outbox; their retries are rescheduled in
+    # the table rather than in memory.
+    outbox_id: int | None = None
+
+
+class JobQueue:
+    # Handlers are plain functions taking (db, payload); they run in the
+    # threadpool on a session of their own. Durable jobs are claimed from the
+    # outbox with a lease, so a crash mid-job only delays it until the lease
+    # runs out: delivery is at least once and handlers must be idempotent.
+
+    def __init__(
+        self,
+        session_factory,
+        workers: int = JOB_WORKERS,
+        maxsize: int = JOB_QUEUE_SIZE,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        batch_size: int = JOB_BATCH_SIZE,
+        poll_seconds: float = JOB_POLL_SECONDS,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+        drain_seconds: float = JOB_DRAIN_SECONDS,
+        backoff_seconds: float = JOB_BACKOFF_SECONDS,
+        backoff_max_seconds: float = JOB_BACKOFF_MAX_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.handlers = {}
+        self.workers = workers
+        self.maxsize = maxsize
+        self.max_attempts = max_attempts
+        self.batch_size = min(batch_size, maxsize)
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.drain_seconds = drain_seconds
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.queue: asyncio.Queue | None = None
+        self.tasks: list[asyncio.Task] = []
+        self.retries: set[asyncio.Task] = set()
+        self.wakeup: asyncio.Event | None = None
+        self.stopping = False
+
+    def register(self, name: str):
+        def decorator(handler):
+            self.handlers[name] = handler
+            return handler
+        return decorator
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.wakeup = asyncio.Event()
+        self.stopping = False
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self.relay()))
+
+    async def stop(self):
+        # Stop claiming, give queued jobs drain_seconds to finish, then cancel
+        # the rest. Outbox jobs left unfinished keep their row and run again
+        # once their lease expires; in-memory jobs left behind are lost.
+        self.stopping = True
+        if self.queue is None:
+            return
+
+        self.wakeup.set()
+        for task in self.retries:
+            task.cancel()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=self.drain_seconds)
+        except asyncio.TimeoutError:
+            logger.warning("Shutting down with %d jobs still queued", self.queue.qsize())
+
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, *self.retries, return_exceptions=True)
+        self.tasks = []
+        self.retries = set()
+        JOB_QUEUE_DEPTH.set(0)
+
+    def notify(self):
+        # Called after a commit that wrote outbox rows, so they are picked up
+        # now instead of at the next poll.
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def submit(self, name: str, payload: dict) -> bool:
+        # In-memory and best effort: for side effects that may be lost on a
+        # crash. When the queue is full the job is dropped, never the request
+        # made to wait.
+        if self.queue is None or self.stopping:
+            return False
+        try:
+            self.put(Job(name=name, payload=payload))
+        except asyncio.QueueFull:
+            JOBS.labels(name, "dropped").inc()
+            return False
+        return True
+
+    def put(self, job: Job):
+        self.queue.put_nowait(job)
+        JOB_QUEUE_DEPTH.set(self.queue.qsize())
+
+    async def relay(self):
+        while not self.stopping:
+            # Cleared before claiming, so a commit that lands during the claim
+            # still wakes the next wait.
+            self.wakeup.clear()
+            # At most one batch is held in memory, and a batch must finish
+            # within the lease or its rows are claimed again.
+            wanted = self.batch_size - self.queue.qsize()
+            claimed = []
+            if wanted > 0:
+                try:
+                    claimed = await run_in_threadpool(self.claim, wanted)
+                except Exception:
+                    logger.exception("Claiming outbox jobs failed")
+                for job in claimed:
+                    # Blocks only if a retry or submit took the slot meanwhile.
+                    await self.queue.put(job)
+                    JOB_QUEUE_DEPTH.set(self.queue.qsize())
+
+            # A full batch means more rows are probably due: the workers wake
+            # this up once they empty the queue. Otherwise sleep until the next
+            # poll or until a request commits new ones.
+            if wanted > 0 and len(claimed) == wanted:
+                continue
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def claim(self, limit: int) -> list[Job]:
+        now = datetime.now()
+        due = (
+            OutboxJob.failed_at.is_(None),
+            OutboxJob.available_at <= now
+        )
+        with self.session_factory() as db:
+            postgresql = db.get_bind().dialect.name == "postgresql"
+
+            # A plain read first: an idle outbox costs one indexed SELECT per
+            # poll and never takes SQLite's writer lock.
+            query = select(OutboxJob.id).where(*due).order_by(OutboxJob.id).limit(limit)
+            if postgresql:
+                query = query.with_for_update(skip_locked=True)
+            ids = db.execute(query).scalars().all()
+            if not ids:
+                db.rollback()
+                return []
+
+            # SQLite cannot upgrade a read transaction another writer has
+            # overtaken, so end it; the UPDATE re-checks the due condition,
+            # and on Postgres the rows stay locked by the SELECT.
+            if not postgresql:
+                db.rollback()
+
+            # Pushing available_at past the lease is the claim: other workers
+            # and processes skip the row until the lease runs out.
+            result = db.execute(
+                update(OutboxJob)
+                .where(OutboxJob.id.in_(ids), *due)
+                .values(
+                    available_at=now + timedelta(seconds=self.lease_seconds),
+                    attempts=OutboxJob.attempts + 1
+                )
+                .returning(OutboxJob.id, OutboxJob.name, OutboxJob.payload, OutboxJob.attempts)
+            ).all()
+            db.commit()
+
+        return [
+            Job(name=row.name, payload=json.loads(row.payload), attempts=row.attempts, outbox_id=row.id)
+            for row in sorted(result, key=lambda row: row.id)
+        ]
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            JOB_QUEUE_DEPTH.set(self.queue.qsize())
+            if self.queue.empty():
+                self.wakeup.set()
+            try:
+                await self.run(job)
+            finally:
+                self.queue.task_done()
+
+    async def run(self, job: Job):
+        started = time.perf_counter()
+        try:
+            handler = self.handlers[job.name]
+            await run_in_threadpool(self.call, handler, job.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            JOB_DURATION.labels(job.name).observe(time.perf_counter() - started)
+            await self.failed(job, e)
+            return
+
+        JOB_DURATION.labels(job.name).observe(time.perf_counter() - started)
+        JOBS.labels(job.name, "done").inc()
+        if job.outbox_id is not None:
+            await run_in_threadpool(self.finish, job.outbox_id)
+
+    def call(self, handler, payload: dict):
+        with self.session_factory() as db:
+            handler(db, payload)
+
+    async def failed(self, job: Job, error: Exception):
+        if job.attempts >= self.max_attempts:
+            logger.error("Job %s failed after %d attempts: %r", job.name, job.attempts, error)
+            JOBS.labels(job.name, "failed").inc()
+            if job.outbox_id is not None:
+                await run_in_threadpool(self.reschedule, job.outbox_id, None, repr(error))
+            return
+
+        delay = backoff(job.attempts, self.backoff_seconds, self.backoff_max_seconds)
+        logger.warning("Job %s failed (attempt %d), retrying in %.1fs: %r", job.name, job.attempts, delay, error)
+        JOBS.labels(job.name, "retried").inc()
+        if job.outbox_id is not None:
+            await run_in_threadpool(self.reschedule, job.outbox_id, delay, repr(error))
+        elif not self.stopping:
+            task = asyncio.create_task(self.retry_later(Job(name=job.name, payload=job.payload, attempts=job.attempts + 1), delay))
+            self.retries.add(task)
+            task.add_done_callback(self.retries.discard)
+
+    async def retry_later(self, job: Job, delay: float):
+        await asyncio.sleep(delay)
+        await self.queue.put(job)
+        JOB_QUEUE_DEPTH.set(self.queue.qsize())
+
+    def finish(self, outbox_id: int):
+        with self.session_factory() as db:
+            db.execute(delete(OutboxJob).where(OutboxJob.id == outbox_id))
+            db.commit()
+
+    def reschedule(self, outbox_id: int, delay: float | None, error: str):
+        # delay None parks the row as failed; it stays for inspection and can
+        # be retried by clearing failed_at.
+        now = datetime.now()
+        values = {OutboxJob.last_error: error}
+        if delay is None:
+            values[OutboxJob.failed_at] = now
+        else:
+            values[OutboxJob.available_at] = now + timedelta(seconds=delay)
+
+        with self.session_factory() as db:
+            db.execute(update(OutboxJob).where(OutboxJob.id == outbox_id).values(values))
+            db.commit()
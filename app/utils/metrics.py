@@ -0,0 +1,155 @@
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+
+# With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+# directory before start-up: every worker then writes its samples there and
+# /metrics aggregates all of them, whichever worker serves the scrape.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 7, 10, 15, 20, 50)
+
+REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=LATENCY_BUCKETS)
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served", multiprocess_mode="livesum")
+POOL_CHECKOUT_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", buckets=QUERY_BUCKETS)
+QUERIES = Counter("db_queries_total", "SQL statements executed")
+QUERY_DURATION = Histogram("db_query_duration_seconds", "SQL statement duration", buckets=QUERY_BUCKETS)
+REQUEST_QUERIES = Histogram("http_request_db_queries", "SQL statements per HTTP request", ["method", "route"], buckets=QUERY_COUNT_BUCKETS)
+REQUEST_QUERY_DURATION = Histogram("http_request_db_duration_seconds", "Time spent in SQL per HTTP request", ["method", "route"], buckets=LATENCY_BUCKETS)
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups", ["cache", "result"])
+CACHE_EVICTIONS = Counter("cache_evictions_total", "Cache entries dropped for size or age", ["cache"])
+CACHE_ENTRIES = Gauge("cache_entries", "Entries held by in-process caches", ["cache"], multiprocess_mode="livesum")
+JOB_QUEUE_DEPTH = Gauge("job_queue_depth", "Background jobs waiting for a worker", multiprocess_mode="livesum")
+JOBS = Counter("jobs_total", "Background jobs by outcome", ["name", "outcome"])
+JOB_DURATION = Histogram("job_duration_seconds", "Background job run time", ["name"], buckets=LATENCY_BUCKETS)
+
+
+class RequestStats:
+    # One per request, shared by reference: threadpool calls run in a copy
+    # of the request's context, so they must mutate it rather than rebind.
+    # statements stays None unless query tracing asks to keep them.
+    __slots__ = ("queries", "query_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.statements = None
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+# Called as observer(conn, statement, parameters, executemany, elapsed, stats)
+# after every statement, so other instrumentation (query_trace) shares this
+# one pair of cursor events and its timing.
+query_observers = []
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started_at"].pop()
+    QUERIES.inc()
+    QUERY_DURATION.observe(elapsed)
+
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+
+    for observer in query_observers:
+        observer(conn, statement, parameters, executemany, elapsed, stats)
+
+
+def instrument_engine(engine: Engine):
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    # The pool has no "before checkout" event, so time the call itself; it
+    # covers waiting for a free connection and opening a new one.
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+
+
+class MetricsMiddleware:
+    def __init__(self, app, routes: list | None = None):
+        self.app = app
+        self.routes = routes or []
+
+    def route_template(self, scope) -> str:
+        # Label by route template, never the raw path, so ids in URLs cannot
+        # blow up the number of series. Requests answered before routing (a
+        # 429 from the limiter) are matched against the routes here.
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            current_request.reset(token)
+
+            template = self.route_template(scope)
+            method = scope["method"]
+            REQUESTS.labels(method, template, str(status)).inc()
+            REQUEST_LATENCY.labels(method, template).observe(elapsed)
+            REQUEST_QUERIES.labels(method, template).observe(stats.queries)
+            REQUEST_QUERY_DURATION.labels(method, template).observe(stats.query_seconds)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    # Drops this worker's in-flight gauge from the shared directory.
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,38 @@
+from enum import Enum
+
+from sqlalchemy.orm import Session
+
+
+class WriteResult(Enum):
+    DONE = "done"
+    NOT_FOUND = "not found"
+    UNCHANGED = "unchanged"
+    PARENT_NOT_FOUND = "parent not found"
+    FORBIDDEN = "forbidden"
+
+
+def owned_write(db: Session, statement, id_column, lookups: list[tuple[WriteResult, object]], owned=None) -> WriteResult:
+    # The statement carries the ownership check in its WHERE clause and
+    # RETURNING id, so the common case is one round trip with no window
+    # between check and write. A None statement means there is nothing to
+    # write and only the checks run.
+    if statement is not None:
+        if db.execute(statement.returning(id_column)).first() is not None:
+            db.commit()
+            return WriteResult.DONE
+
+        # Nothing matched: release the write lock first, then work out why.
+        db.rollback()
+
+    # An update that also filters on "some value differs" matches nothing
+    # when it would not change the row; owned tells that apart from a row
+    # the caller may not write.
+    if owned is not None and db.execute(owned).first() is not None:
+        return WriteResult.UNCHANGED
+
+    # Each lookup is an existence query; the first that finds nothing decides
+    # the result, and if every row exists the caller does not own it.
+    for result, query in lookups:
+        if db.execute(query).first() is None:
+            return result
+    return WriteResult.FORBIDDEN
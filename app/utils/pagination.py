@@ -0,0 +1,29 @@
+import base64
+import json
+
+
+# Cursor values and offsets are bound against INTEGER columns, which are
+# 32-bit on Postgres; anything outside that could not come from a real page.
+INTEGER_MAX = 2 ** 31 - 1
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+
+    return tuple(values)
+
+
+def is_integer(value) -> bool:
+    # bool is an int subclass, and json.loads gives arbitrarily large ints.
+    return type(value) is int and -INTEGER_MAX - 1 <= value <= INTEGER_MAX
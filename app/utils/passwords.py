@@ -0,0 +1,125 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+from argon2 import PasswordHasher as Argon2Hasher
+from argon2.exceptions import InvalidHashError, VerificationError
+
+
+PASSWORD_HASH_ALGORITHM = os.getenv("PASSWORD_HASH_ALGORITHM", "argon2id")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+# Defaults follow the OWASP password storage minimums for each algorithm.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST_KB = int(os.getenv("ARGON2_MEMORY_COST_KB", "19456"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+
+SCRYPT_LOG_N = int(os.getenv("SCRYPT_LOG_N", "15"))
+SCRYPT_R = int(os.getenv("SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("SCRYPT_P", "1"))
+
+ALGORITHMS = ("argon2id", "scrypt")
+
+
+def b64encode(value: bytes) -> str:
+    return base64.b64encode(value).decode().rstrip("=")
+
+
+def b64decode(value: str) -> bytes:
+    return base64.b64decode(value + "=" * (-len(value) % 4))
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        algorithm: str = PASSWORD_HASH_ALGORITHM,
+        workers: int = PASSWORD_HASH_WORKERS,
+        argon2_time_cost: int = ARGON2_TIME_COST,
+        argon2_memory_cost_kb: int = ARGON2_MEMORY_COST_KB,
+        argon2_parallelism: int = ARGON2_PARALLELISM,
+        scrypt_log_n: int = SCRYPT_LOG_N,
+        scrypt_r: int = SCRYPT_R,
+        scrypt_p: int = SCRYPT_P
+    ):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+
+        self.algorithm = algorithm
+        self.argon2 = Argon2Hasher(
+            time_cost=argon2_time_cost,
+            memory_cost=argon2_memory_cost_kb,
+            parallelism=argon2_parallelism
+        )
+        self.scrypt_params = (scrypt_log_n, scrypt_r, scrypt_p)
+        # Both KDFs release the GIL while they run, so a thread pool sized to
+        # the cores is enough to keep them off the event loop and bound how
+        # much CPU hashing can take at once.
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    def scrypt(self, password: str, salt: bytes, log_n: int, r: int, p: int) -> bytes:
+        n = 1 << log_n
+        return hashlib.scrypt(
+            password.encode(),
+            salt=salt,
+            n=n,
+            r=r,
+            p=p,
+            maxmem=128 * r * (n + p + 2),
+            dklen=32
+        )
+
+    def hash(self, password: str) -> str:
+        if self.algorithm == "argon2id":
+            return self.argon2.hash(password)
+
+        log_n, r, p = self.scrypt_params
+        salt = secrets.token_bytes(16)
+        digest = self.scrypt(password, salt, log_n, r, p)
+        return f"$scrypt$ln={log_n},r={r},p={p}${b64encode(salt)}${b64encode(digest)}"
+
+    def verify(self, stored: str, password: str) -> bool:
+        if stored.startswith("$argon2"):
+            try:
+                return self.argon2.verify(stored, password)
+            except (VerificationError, InvalidHashError):
+                return False
+
+        if stored.startswith("$scrypt$"):
+            try:
+                _, _, params, salt, digest = stored.split("$")
+                values = dict(param.split("=") for param in params.split(","))
+                expected = self.scrypt(password, b64decode(salt), int(values["ln"]), int(values["r"]), int(values["p"]))
+            except (ValueError, KeyError):
+                return False
+            return hmac.compare_digest(expected, b64decode(digest))
+
+        # Accounts created before hashing still hold the plain password;
+        # they are rehashed on their next successful login.
+        return hmac.compare_digest(stored.encode(), password.encode())
+
+    def needs_rehash(self, stored: str) -> bool:
+        if self.algorithm == "argon2id":
+            return not stored.startswith("$argon2id$") or self.argon2.check_needs_rehash(stored)
+
+        log_n, r, p = self.scrypt_params
+        return not stored.startswith(f"$scrypt$ln={log_n},r={r},p={p}$")
+
+    def check(self, stored: str, password: str) -> tuple[bool, str | None]:
+        # Returns whether the password matches and, when the stored hash
+        # uses outdated parameters, a fresh hash to replace it with.
+        if not self.verify(stored, password):
+            return False, None
+
+        if self.needs_rehash(stored):
+            return True, self.hash(password)
+        return True, None
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.hash, password)
+
+    async def check_async(self, stored: str, password: str) -> tuple[bool, str | None]:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.check, stored, password)
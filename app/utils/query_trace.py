@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import os
+import re
+
+from attrs import define
+
+from .database import env_flag
+from .metrics import RequestStats, current_request, query_observers
+
+
+logger = logging.getLogger("saniraq.sql")
+
+# Opt-in: SQL_TRACE records every statement per request and logs a summary
+# at DEBUG; SLOW_QUERY_MS logs statements slower than the threshold with
+# their plan; SQL_TRACE_HEADER (development only) adds X-Query-Count to
+# responses so tests can assert on query fan-out. All of it rides on the
+# metrics cursor events and per-request RequestStats.
+SQL_TRACE = env_flag("SQL_TRACE")
+SQL_TRACE_HEADER = env_flag("SQL_TRACE_HEADER")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+
+EXPLAIN_PREFIXES = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}
+EXPLAINABLE = ("select", "update", "delete", "insert", "with")
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+BIND_PARAMETER = re.compile(r"%\(\w+\)s|\$\d+|:\w+|\?")
+IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+@define
+class TracedStatement:
+    fingerprint: str
+    statement: str
+    duration_ms: float
+
+
+def normalize(statement: str) -> str:
+    # Literals and bind parameters become ?, and IN lists of any length one
+    # (?+), so the same query shape always has the same fingerprint.
+    statement = STRING_LITERAL.sub("?", statement)
+    statement = NUMBER_LITERAL.sub("?", statement)
+    statement = BIND_PARAMETER.sub("?", statement)
+    statement = IN_LIST.sub("(?+)", statement)
+    return WHITESPACE.sub(" ", statement).strip()
+
+
+def fingerprint(statement: str) -> str:
+    return hashlib.sha1(normalize(statement).encode()).hexdigest()[:16]
+
+
+def explain(conn, statement: str, parameters) -> str | None:
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().lower().startswith(EXPLAINABLE):
+        return None
+
+    # A separate DBAPI cursor, so the plan query neither fires these events
+    # again nor disturbs the rows still pending on the original cursor.
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(" ".join(str(value) for value in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        cursor.close()
+
+
+def observe_query(conn, statement, parameters, executemany, elapsed: float, stats: RequestStats | None):
+    duration_ms = elapsed * 1000
+    if stats is not None and stats.statements is not None:
+        stats.statements.append(TracedStatement(fingerprint(statement), statement, duration_ms))
+
+    if SLOW_QUERY_MS and duration_ms >= SLOW_QUERY_MS:
+        plan = None if executemany else explain(conn, statement, parameters)
+        logger.warning("Slow query (%.1fms) [%s]: %s\nPlan:\n%s", duration_ms, fingerprint(statement), statement, plan)
+
+
+def instrument_queries():
+    # Engines get their cursor events from metrics.instrument_engine.
+    if (SQL_TRACE or SLOW_QUERY_MS) and observe_query not in query_observers:
+        query_observers.append(observe_query)
+
+
+class QueryTraceMiddleware:
+    def __init__(self, app, header: bool = SQL_TRACE_HEADER):
+        self.app = app
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        # Runs inside MetricsMiddleware, which owns the request's stats.
+        stats = current_request.get()
+        if scope["type"] != "http" or stats is None:
+            return await self.app(scope, receive, send)
+
+        stats.statements = []
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and self.header:
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-query-count", str(stats.queries).encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("%s %s: %d queries in %.1fms", scope["method"], scope["path"], stats.queries, stats.query_seconds * 1000)
+                for traced in stats.statements:
+                    logger.debug("  %.2fms [%s] %s", traced.duration_ms, traced.fingerprint, normalize(traced.statement))
@@ -0,0 +1,248 @@
+import json
+import math
+import os
+import re
+import time
+
+import orjson
+from attrs import define
+from starlette.routing import compile_path
+
+
+# How many proxies in front of the app append to X-Forwarded-For; 0 keys
+# per-IP buckets on the peer address.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Per-route limits keyed by "METHOD /route/template"; "ip" buckets apply to
+# every caller, "user" buckets to authenticated ones. RATE_LIMITS (JSON in the
+# same shape) overrides entries, and RATE_LIMIT_DEFAULT covers other routes.
+DEFAULT_RULES = {
+    "POST /auth/users/login": {"ip": "10/minute"},
+    "POST /auth/users": {"ip": "5/minute"},
+    "GET /shanyraks": {"ip": "120/minute", "user": "120/minute"},
+    "POST /shanyraks/{id}/comments": {"ip": "30/minute", "user": "10/minute"},
+}
+
+
+@define(frozen=True)
+class Limit:
+    capacity: int
+    rate: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        # "10/minute": a burst of 10 that refills at 10 tokens a minute.
+        count, period = value.split("/")
+        return cls(capacity=int(count), rate=int(count) / PERIODS[period.strip()])
+
+
+@define(frozen=True)
+class RouteLimit:
+    method: str
+    pattern: re.Pattern
+    template: str
+    ip: Limit | None
+    user: Limit | None
+
+
+class MemoryBucketStore:
+    # Only the event loop touches the buckets and take() never awaits, so
+    # each read-modify-write is atomic without a lock.
+    def __init__(self, max_keys: int = 100_000):
+        self.buckets = {}
+        self.max_keys = max_keys
+
+    async def take(self, buckets: list[tuple[str, Limit]]) -> float:
+        # A request spends a token from every bucket or from none, so being
+        # limited per user does not also drain the caller's IP bucket.
+        now = time.monotonic()
+        states = []
+        retry_after = 0.0
+        for key, limit in buckets:
+            tokens, updated_at = self.buckets.get(key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - updated_at) * limit.rate)
+            if tokens < 1:
+                retry_after = max(retry_after, (1 - tokens) / limit.rate)
+            states.append((key, tokens))
+
+        if len(self.buckets) + len(buckets) > self.max_keys:
+            self.prune()
+        for key, tokens in states:
+            self.buckets[key] = (tokens if retry_after else tokens - 1, now)
+        return retry_after
+
+    def prune(self):
+        # Drop the oldest half; an idle bucket has refilled anyway, so
+        # forgetting it only matters for callers that are still active.
+        oldest = sorted(self.buckets.items(), key=lambda item: item[1][1])
+        for key, _ in oldest[:len(oldest) // 2]:
+            del self.buckets[key]
+
+
+class RedisBucketStore:
+    # Each bucket lives in a hash and all of a request's buckets are updated
+    # by one script call: one round trip, and concurrent workers sharing the
+    # server cannot both spend the last token.
+    SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local states = {}
+    local retry_after = 0
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[i * 2])
+        local rate = tonumber(ARGV[i * 2 + 1])
+        local state = redis.call('HMGET', key, 'tokens', 'updated_at')
+        local tokens = tonumber(state[1]) or capacity
+        local updated_at = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+        if tokens < 1 then
+            retry_after = math.max(retry_after, (1 - tokens) / rate)
+        end
+        states[i] = {tokens, math.ceil(capacity / rate * 1000)}
+    end
+    for i, key in ipairs(KEYS) do
+        local tokens = states[i][1]
+        if retry_after == 0 then
+            tokens = tokens - 1
+        end
+        redis.call('HSET', key, 'tokens', tostring(tokens), 'updated_at', tostring(now))
+        redis.call('PEXPIRE', key, states[i][2])
+    end
+    return tostring(retry_after)
+    """
+
+    def __init__(self, client, prefix: str = "saniraq:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self.script = client.register_script(self.SCRIPT)
+
+    async def take(self, buckets: list[tuple[str, Limit]]) -> float:
+        args = [time.time()]
+        for _, limit in buckets:
+            args += [limit.capacity, limit.rate]
+        retry_after = await self.script(keys=[self.prefix + key for key, _ in buckets], args=args)
+        return float(retry_after)
+
+
+def build_rules(rules: dict[str, dict[str, str]]) -> list[RouteLimit]:
+    route_limits = []
+    for route, limits in rules.items():
+        method, template = route.split(" ", 1)
+        pattern, _, _ = compile_path(template)
+        route_limits.append(RouteLimit(
+            method=method.upper(),
+            pattern=pattern,
+            template=template,
+            ip=Limit.parse(limits["ip"]) if limits.get("ip") else None,
+            user=Limit.parse(limits["user"]) if limits.get("user") else None
+        ))
+    return route_limits
+
+
+def client_ip(scope, proxy_hops: int = 0) -> str:
+    # Each trusted proxy appends the address it was reached from, so the
+    # entry proxy_hops from the end is the client as seen by the outermost
+    # one. Anything left of it came from the client and can be made up;
+    # uvicorn's own proxy handling takes the leftmost entry, so the scope's
+    # client cannot be used once a proxy is trusted.
+    if proxy_hops:
+        forwarded = [
+            entry.strip()
+            for name, value in scope["headers"] if name == b"x-forwarded-for"
+            for entry in value.decode("latin-1").split(",")
+        ]
+        if len(forwarded) >= proxy_hops:
+            return forwarded[-proxy_hops]
+
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app,
+        store,
+        rules: list[RouteLimit],
+        default: RouteLimit | None = None,
+        identify=None,
+        proxy_hops: int = TRUSTED_PROXY_HOPS
+    ):
+        self.app = app
+        self.store = store
+        self.rules = rules
+        self.default = default
+        # Maps a bearer token to a user id, or None when it is not valid.
+        self.identify = identify
+        self.proxy_hops = proxy_hops
+
+    def match(self, method: str, path: str) -> RouteLimit | None:
+        for rule in self.rules:
+            if rule.method == method and rule.pattern.match(path):
+                return rule
+        return self.default
+
+    def user_id(self, scope) -> str | None:
+        if self.identify is None:
+            return None
+
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and token:
+                    return self.identify(token)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        rule = self.match(scope["method"], scope["path"])
+        if rule is None:
+            return await self.app(scope, receive, send)
+
+        route = f"{rule.method} {rule.template}"
+        buckets = []
+        if rule.ip is not None:
+            ip = client_ip(scope, self.proxy_hops)
+            buckets.append((f"ip:{ip}:{route}", rule.ip))
+
+        if rule.user is not None:
+            user_id = self.user_id(scope)
+            if user_id is not None:
+                buckets.append((f"user:{user_id}:{route}", rule.user))
+
+        if not buckets:
+            return await self.app(scope, receive, send)
+
+        retry_after = await self.store.take(buckets)
+        if retry_after:
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(math.ceil(retry_after)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": orjson.dumps({"detail": "Too many requests"})})
+            return
+
+        await self.app(scope, receive, send)
+
+
+def create_rate_limit_store():
+    if os.getenv("RATE_LIMIT_BACKEND", "memory") == "redis":
+        import redis.asyncio
+
+        return RedisBucketStore(redis.asyncio.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+
+    return MemoryBucketStore()
+
+
+def load_rules() -> tuple[list[RouteLimit], RouteLimit | None]:
+    rules = {**DEFAULT_RULES, **json.loads(os.getenv("RATE_LIMITS", "{}"))}
+    default = os.getenv("RATE_LIMIT_DEFAULT", "300/minute")
+    default_rule = build_rules({"* /{path:path}": {"ip": default}})[0] if default else None
+    return build_rules(rules), default_rule
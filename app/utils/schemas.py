@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime
+from typing import Optional
 from .database import Base
 
 
@@ -18,13 +20,30 @@ class UserProfileResponse(BaseModel):
     city: str
 
 
+class TokenResponse(BaseModel):
+    access_token: str
+
+
 class UserProfileEdit(BaseModel):
-    phone: str
-    name: str
-    city: str
+    phone: Optional[str] = None
+    name: Optional[str] = None
+    city: Optional[str] = None
 
 
-class AdCreateRequest(BaseModel):
+class AdLocation(BaseModel):
+    # A half-given point would be stored with no geohash or R-tree entry and
+    # silently drop out of map and tile queries.
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+    @model_validator(mode="after")
+    def check_location(self):
+        if (self.latitude is None) != (self.longitude is None):
+            raise ValueError("latitude and longitude must be given together")
+        return self
+
+
+class AdCreateRequest(AdLocation):
     type: str
     price: int
     address: str
@@ -40,15 +59,70 @@ class AdResponse(BaseModel):
     address: str
     area: float
     rooms_count: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    is_favorite: Optional[bool] = None
+    comment_count: Optional[int] = None
 
 
-class AdEdit(BaseModel):
+class AdCreatedResponse(BaseModel):
+    id: int
+
+
+class AdDetailResponse(BaseModel):
+    id: int
     type: str
     price: int
     address: str
     area: float
     rooms_count: int
     description: str
+    user_id: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+class AdSearchResponse(BaseModel):
+    total: int
+    objects: list[AdResponse]
+    next_cursor: Optional[str] = None
+
+
+class PriceStatsResponse(BaseModel):
+    count: int
+    average_price: Optional[float] = None
+    median_price: Optional[int] = None
+    p25_price: Optional[int] = None
+    p75_price: Optional[int] = None
+    p90_price: Optional[int] = None
+
+
+class PriceStatsGroupResponse(PriceStatsResponse):
+    type: str
+    rooms_count: int
+
+
+class AdStatsResponse(BaseModel):
+    groups: list[PriceStatsGroupResponse]
+    total: PriceStatsResponse
+
+
+class FavoriteAdResponse(BaseModel):
+    id: int
+    address: str
+
+
+class FavoritesResponse(BaseModel):
+    shanyraks: list[FavoriteAdResponse]
+
+
+class AdEdit(AdLocation):
+    type: Optional[str] = None
+    price: Optional[int] = None
+    address: Optional[str] = None
+    area: Optional[float] = None
+    rooms_count: Optional[int] = None
+    description: Optional[str] = None
 
 
 class CommentCreateRequest(BaseModel):
@@ -57,3 +131,23 @@ class CommentCreateRequest(BaseModel):
 
 class CommentEdit(BaseModel):
     content: str
+
+
+class CommentAuthor(BaseModel):
+    name: Optional[str] = None
+    city: Optional[str] = None
+
+
+class CommentResponse(BaseModel):
+    id: int
+    content: str
+    created_at: Optional[datetime] = None
+    edited: Optional[bool] = None
+    owner_id: int
+    ad_id: int
+    author: Optional[CommentAuthor] = None
+
+
+class CommentsPageResponse(BaseModel):
+    comments: list[CommentResponse]
+    next_cursor: Optional[str] = None
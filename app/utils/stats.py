@@ -0,0 +1,216 @@
+from sqlalchemy import column, inspect, table, text
+from sqlalchemy.engine import Connection
+
+
+# ad_price_stats keeps, per (type, rooms_count, price bucket), how many ads
+# fall in the bucket and the sum of their prices. Triggers on advertisements
+# maintain it inside the writing statement's own transaction, so create_ad,
+# update_ad, delete_ad_by_id and bulk imports all keep it exact without any
+# extra round trip; rebuild_price_stats reconciles it from scratch.
+#
+# Buckets need no math functions, so they can be computed in SQL on both
+# backends: prices under 100 are exact, larger ones are keyed by their digit
+# count and first two digits, i.e. 90 buckets per decade at 1-10% width.
+BUCKET_SQL = (
+    "CASE WHEN {price} < 0 THEN 0 WHEN {price} < 100 THEN {price} "
+    "ELSE (length(CAST({price} AS TEXT)) - 3) * 90 + CAST(substr(CAST({price} AS TEXT), 1, 2) AS INTEGER) + 90 END"
+)
+EXACT_BUCKETS = 100
+
+TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS ad_price_stats (
+    type VARCHAR NOT NULL,
+    rooms_count INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    price_sum BIGINT NOT NULL,
+    PRIMARY KEY (type, rooms_count, bucket)
+)
+"""
+
+ADD_SQL = """
+INSERT INTO ad_price_stats (type, rooms_count, bucket, count, price_sum)
+VALUES (new.type, new.rooms_count, {bucket}, 1, new.price)
+ON CONFLICT (type, rooms_count, bucket) DO UPDATE
+SET count = ad_price_stats.count + 1, price_sum = ad_price_stats.price_sum + excluded.price_sum
+""".format(bucket=BUCKET_SQL.format(price="new.price"))
+
+REMOVE_SQL = """
+UPDATE ad_price_stats SET count = count - 1, price_sum = price_sum - old.price
+WHERE type = old.type AND rooms_count = old.rooms_count AND bucket = {bucket}
+""".format(bucket=BUCKET_SQL.format(price="old.price"))
+
+COUNTED = "{row}.type IS NOT NULL AND {row}.rooms_count IS NOT NULL AND {row}.price IS NOT NULL"
+
+SQLITE_DDL = [
+    TABLE_DDL,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS ad_price_stats_insert AFTER INSERT ON advertisements
+    WHEN {COUNTED.format(row="new")} BEGIN
+        {ADD_SQL};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS ad_price_stats_delete AFTER DELETE ON advertisements
+    WHEN {COUNTED.format(row="old")} BEGIN
+        {REMOVE_SQL};
+    END
+    """,
+    # Two triggers for an update, so a row that enters or leaves the counted
+    # set (a NULL price, say) is only added or only removed.
+    f"""
+    CREATE TRIGGER IF NOT EXISTS ad_price_stats_update_old AFTER UPDATE OF type, rooms_count, price ON advertisements
+    WHEN {COUNTED.format(row="old")} BEGIN
+        {REMOVE_SQL};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS ad_price_stats_update_new AFTER UPDATE OF type, rooms_count, price ON advertisements
+    WHEN {COUNTED.format(row="new")} BEGIN
+        {ADD_SQL};
+    END
+    """,
+]
+
+POSTGRES_DDL = [
+    TABLE_DDL,
+    f"""
+    CREATE OR REPLACE FUNCTION ad_price_stats_apply() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') AND {COUNTED.format(row="old")} THEN
+            {REMOVE_SQL};
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND {COUNTED.format(row="new")} THEN
+            {ADD_SQL};
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS ad_price_stats_apply ON advertisements",
+    """
+    CREATE TRIGGER ad_price_stats_apply
+    AFTER INSERT OR DELETE OR UPDATE OF type, rooms_count, price ON advertisements
+    FOR EACH ROW EXECUTE FUNCTION ad_price_stats_apply()
+    """,
+]
+
+# Replacing the trigger locks advertisements ACCESS EXCLUSIVE, and workers
+# booting together would race on the function, so once the trigger is there
+# (it is created last) Postgres skips the DDL; the migration installs it.
+POSTGRES_INSTALLED = """
+SELECT EXISTS (
+    SELECT 1 FROM pg_trigger
+    WHERE tgname = 'ad_price_stats_apply' AND tgrelid = to_regclass('advertisements')
+)
+"""
+
+ad_price_stats = table(
+    "ad_price_stats",
+    column("type"),
+    column("rooms_count"),
+    column("bucket"),
+    column("count"),
+    column("price_sum"),
+)
+
+
+def ensure_price_stats(connection: Connection):
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        if connection.execute(text(POSTGRES_INSTALLED)).scalar():
+            return
+        statements = POSTGRES_DDL
+    elif dialect == "sqlite":
+        statements = SQLITE_DDL
+    else:
+        return
+
+    exists = inspect(connection).has_table("ad_price_stats")
+    for statement in statements:
+        connection.execute(text(statement))
+    if not exists:
+        rebuild_price_stats(connection)
+
+
+def drop_price_stats(connection: Connection):
+    dialect = connection.dialect.name
+
+    if dialect == "postgresql":
+        connection.execute(text("DROP TRIGGER IF EXISTS ad_price_stats_apply ON advertisements"))
+        connection.execute(text("DROP FUNCTION IF EXISTS ad_price_stats_apply()"))
+    elif dialect == "sqlite":
+        for trigger in ("ad_price_stats_insert", "ad_price_stats_delete", "ad_price_stats_update_old", "ad_price_stats_update_new"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    connection.execute(text("DROP TABLE IF EXISTS ad_price_stats"))
+
+
+def rebuild_price_stats(connection: Connection) -> int:
+    # Writers are held off for the duration on Postgres, so no ad is counted
+    # both by the rebuild and by its trigger; SQLite serialises writers anyway.
+    # A full scan outlasts the app engine's DATABASE_STATEMENT_TIMEOUT_MS, so
+    # lift it for this transaction only.
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SET LOCAL statement_timeout = 0"))
+        connection.execute(text("LOCK TABLE advertisements IN SHARE MODE"))
+
+    connection.execute(text("DELETE FROM ad_price_stats"))
+    connection.execute(text(
+        "INSERT INTO ad_price_stats (type, rooms_count, bucket, count, price_sum) "
+        "SELECT type, rooms_count, bucket, count(*), sum(price) FROM ("
+        f"SELECT type, rooms_count, price, {BUCKET_SQL.format(price='price')} AS bucket "
+        f"FROM advertisements WHERE {COUNTED.format(row='advertisements')}"
+        ") AS priced GROUP BY type, rooms_count, bucket"
+    ))
+    return connection.execute(text("SELECT coalesce(sum(count), 0) FROM ad_price_stats")).scalar()
+
+
+def price_bucket(price: int) -> int:
+    # Mirrors BUCKET_SQL.
+    if price < 0:
+        return 0
+    if price < EXACT_BUCKETS:
+        return price
+    digits = str(price)
+    return (len(digits) - 3) * 90 + int(digits[:2]) + 90
+
+
+def bucket_bounds(bucket: int) -> tuple[int, int]:
+    # [lower, upper) prices of a bucket.
+    if bucket < EXACT_BUCKETS:
+        return bucket, bucket + 1
+    decade, lead = divmod(bucket - EXACT_BUCKETS, 90)
+    scale = 10 ** (decade + 1)
+    return (lead + 10) * scale, (lead + 11) * scale
+
+
+def estimate_percentile(histogram: list[tuple[int, int, int]], total: int, q: float) -> int | None:
+    # histogram is (bucket, count, price_sum) in bucket order. Prices are
+    # assumed spread evenly inside the bucket holding the wanted rank; a
+    # bucket with a single ad knows its price exactly.
+    if total == 0:
+        return None
+
+    rank = q * (total - 1)
+    seen = 0
+    for bucket, count, price_sum in histogram:
+        if rank < seen + count:
+            if count == 1 or bucket < EXACT_BUCKETS:
+                return round(price_sum / count)
+            lower, upper = bucket_bounds(bucket)
+            return round(lower + (upper - lower) * (rank - seen + 0.5) / count)
+        seen += count
+    return round(histogram[-1][2] / histogram[-1][1])
+
+
+def summarize_histogram(histogram: list[tuple[int, int, int]]) -> dict:
+    total = sum(count for _, count, _ in histogram)
+    price_sum = sum(price_sum for _, _, price_sum in histogram)
+    return {
+        "count": total,
+        "average_price": price_sum / total if total else None,
+        "median_price": estimate_percentile(histogram, total, 0.5),
+        "p25_price": estimate_percentile(histogram, total, 0.25),
+        "p75_price": estimate_percentile(histogram, total, 0.75),
+        "p90_price": estimate_percentile(histogram, total, 0.9),
+    }
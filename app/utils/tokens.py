@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import time
+
+import jwt
+from jwt import InvalidTokenError
+
+from .cache import TTLCache
+from .database import env_flag
+
+
+logger = logging.getLogger("saniraq.auth")
+
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+JWT_TTL = int(os.getenv("JWT_TTL_SECONDS", "3600"))
+JWT_LEEWAY = int(os.getenv("JWT_LEEWAY_SECONDS", "30"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# JWT_KEYS maps key ids to keys: shared secrets for HS256, PEM keys for
+# ES256 and EdDSA. New tokens are signed with JWT_ACTIVE_KID (the first key by
+# default); the others only verify, so a key can be rotated out by adding
+# its successor, switching the active id and dropping the old one once its
+# tokens have expired. JWT_SECRET is shorthand for a single HS256 key.
+#
+# Tokens are trusted without a user lookup, so a guessable key lets anyone
+# act as any user: start-up fails unless a key is configured, and the fixed
+# development key needs JWT_ALLOW_DEV_SECRET=true.
+DEV_SECRET = "saniraq-insecure-development-key-never-deploy"
+
+
+def configured_keys() -> dict[str, str]:
+    if os.getenv("JWT_KEYS"):
+        return json.loads(os.environ["JWT_KEYS"])
+    if os.getenv("JWT_SECRET"):
+        return {"default": os.environ["JWT_SECRET"]}
+    if env_flag("JWT_ALLOW_DEV_SECRET"):
+        logger.warning("Signing tokens with the public development key; never set JWT_ALLOW_DEV_SECRET in production")
+        return {"default": DEV_SECRET}
+    raise RuntimeError("No JWT key configured: set JWT_SECRET or JWT_KEYS (or JWT_ALLOW_DEV_SECRET=true for local development)")
+
+
+ALGORITHMS = ("HS256", "ES256", "EdDSA")
+
+
+def load_key(algorithm: str, value: str) -> tuple:
+    # Returns (signing key, verification key); the signing key is None when
+    # only a public key is configured.
+    if algorithm == "HS256":
+        return value, value
+
+    # cryptography is only needed for the asymmetric algorithms.
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+
+    if "PRIVATE KEY" in value:
+        private_key = load_pem_private_key(value.encode(), password=None)
+        return private_key, private_key.public_key()
+    return None, load_pem_public_key(value.encode())
+
+
+class TokenManager:
+    def __init__(
+        self,
+        keys: dict[str, str] | None = None,
+        active_kid: str | None = None,
+        algorithm: str = JWT_ALGORITHM,
+        ttl: int = JWT_TTL,
+        leeway: int = JWT_LEEWAY,
+        cache_size: int = TOKEN_CACHE_SIZE
+    ):
+        if keys is None:
+            keys = configured_keys()
+        if active_kid is None:
+            active_kid = os.getenv("JWT_ACTIVE_KID") or next(iter(keys))
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown JWT algorithm: {algorithm}")
+        if active_kid not in keys:
+            raise ValueError(f"Active JWT key {active_kid!r} is not configured")
+
+        self.algorithm = algorithm
+        self.keys = {kid: load_key(algorithm, value) for kid, value in keys.items()}
+        self.active_kid = active_kid
+        if self.keys[active_kid][0] is None:
+            raise ValueError(f"Active JWT key {active_kid!r} has no private key")
+
+        self.ttl = ttl
+        self.leeway = leeway
+        self.cache = TTLCache(maxsize=cache_size, ttl=ttl, name="tokens") if cache_size > 0 else None
+
+    def encode(self, user_id: int, username: str) -> str:
+        now = int(time.time())
+        body = {"sub": str(user_id), "username": username, "iat": now, "exp": now + self.ttl}
+        return jwt.encode(body, self.keys[self.active_kid][0], algorithm=self.algorithm, headers={"kid": self.active_kid})
+
+    def decode(self, token: str) -> dict:
+        if self.cache is not None:
+            claims = self.cache.get(token)
+            if claims is not None:
+                return claims
+
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid not in self.keys:
+            raise InvalidTokenError("Unknown key id")
+
+        claims = jwt.decode(
+            token,
+            self.keys[kid][1],
+            algorithms=[self.algorithm],
+            leeway=self.leeway,
+            options={"require": ["sub", "iat", "exp"]}
+        )
+
+        # A verified token is cached until it expires, so hot clients skip
+        # signature checks; entries for rotated-out keys age out the same way.
+        if self.cache is not None:
+            self.cache.set(token, claims, ttl=claims["exp"] + self.leeway - time.time())
+        return claims
@@ -1,7 +1,8 @@
 from attrs import define
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Double
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Double, or_, update
 from sqlalchemy.orm import Session
 
+from .cache import TTLCache
 from .database import Base
 from .schemas import UserProfileEdit
 
@@ -14,6 +15,11 @@ class User(Base):
     password = Column(String)
     name = Column(String)
     city = Column(String)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    # Ids are never reused after a delete, so "user-{id}-v{version}" ETags
+    # cannot match a different account.
+    __table_args__ = {"sqlite_autoincrement": True}
 
 
 @define
@@ -26,15 +32,28 @@ class UserCreate:
 
 
 class UsersRepository:
+    def __init__(self, cache_size: int = 1024, cache_ttl: float = 60):
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl, name="users")
+
     def get_user_by_id(self, db: Session, user_id: int) -> User | None:
         return db.query(User).filter(User.id == user_id).first()
 
+    def get_cached_user_by_id(self, db: Session, user_id: int) -> User | None:
+        user = self.cache.get(user_id)
+        if user is not None:
+            return user
+
+        user = self.get_user_by_id(db=db, user_id=user_id)
+        if user is not None:
+            # Detach the row so it outlives this session and never gets
+            # expired by another request's commit.
+            db.expunge(user)
+            self.cache.set(user_id, user)
+        return user
+
     def get_user_by_username(self, db: Session, username: str) -> User | None:
         return db.query(User).filter(User.username == username).first()
 
-    def get_user_by_password(self, db: Session, password: str) -> User | None:
-        return db.query(User).filter(User.password == password).first()
-
     def get_users(self, db: Session, skip: int = 0, limit: int = 100) -> list[User]:
         return db.query(User).offset(skip).limit(limit).all()
 
@@ -51,11 +70,24 @@ class UsersRepository:
         db.refresh(db_user)
         return db_user
 
-    def update_user(self, db: Session, prev_user: User, new_user: UserProfileEdit) -> User:
-        db_user = db.query(User).filter(User.id == prev_user.id).update({
-            User.phone: new_user.phone,
-            User.name: new_user.name,
-            User.city: new_user.city
-        })
-        db.flush()
+    def update_user(self, db: Session, prev_user: User, new_user: UserProfileEdit) -> bool:
+        changes = {getattr(User, field): value for field, value in new_user.model_dump(exclude_unset=True, exclude_none=True).items()}
+        if not changes:
+            return False
+
+        result = db.execute(
+            update(User)
+            .where(User.id == prev_user.id, or_(*(column.is_distinct_from(value) for column, value in changes.items())))
+            .values({**changes, User.version: User.version + 1})
+        )
+        db.commit()
+        if not result.rowcount:
+            return False
+
+        self.cache.delete(prev_user.id)
+        return True
+
+    def update_password(self, db: Session, user_id: int, password: str):
+        db.query(User).filter(User.id == user_id).update({User.password: password})
         db.commit()
+        self.cache.delete(user_id)
@@ -0,0 +1,66 @@
+"""Measure per-request token verification overhead.
+
+For each algorithm, compares verifying the signature on every request (the
+old behaviour, cache disabled) with the verified-token cache. ES256 and EdDSA
+need the optional cryptography package and are skipped without it.
+
+Usage: python -m scripts.bench_auth [requests] [clients]
+"""
+import statistics
+import sys
+import time
+
+from app.utils.tokens import TokenManager
+
+
+def generate_key(algorithm: str) -> str:
+    if algorithm == "HS256":
+        return "x" * 32
+
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+    if algorithm == "ES256":
+        key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        key = ed25519.Ed25519PrivateKey.generate()
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+
+
+def measure(manager: TokenManager, tokens: list[str], requests: int) -> float:
+    timings = []
+    for i in range(requests):
+        token = tokens[i % len(tokens)]
+        started = time.perf_counter()
+        manager.decode(token)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return statistics.median(timings)
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    print(f"{requests} requests from {clients} clients")
+    for algorithm in ("HS256", "ES256", "EdDSA"):
+        try:
+            keys = {"bench": generate_key(algorithm)}
+        except ImportError:
+            print(f"{algorithm:>6}: skipped, cryptography is not installed")
+            continue
+
+        uncached = TokenManager(keys=keys, active_kid="bench", algorithm=algorithm, cache_size=0)
+        cached = TokenManager(keys=keys, active_kid="bench", algorithm=algorithm)
+        tokens = [cached.encode(user_id=i, username=f"user{i}") for i in range(clients)]
+
+        before = measure(uncached, tokens, requests)
+        after = measure(cached, tokens, requests)
+        print(f"{algorithm:>6}: verify every request p50={before:6.1f}us, cached p50={after:6.1f}us")
+
+
+if __name__ == "__main__":
+    main()
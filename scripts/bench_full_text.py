@@ -0,0 +1,95 @@
+"""Compare LIKE '%...%' scans with the full-text index on a seeded corpus.
+
+Usage: python -m scripts.bench_full_text [rows] [queries]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, or_
+from sqlalchemy.orm import sessionmaker
+
+from app.utils.ads_repository import Ad, AdsRepository
+from app.utils.database import Base
+from app.utils.full_text import ensure_full_text_index
+
+
+STREETS = ["Abay", "Dostyk", "Al-Farabi", "Tole bi", "Satpaev", "Zhandosov", "Nazarbayev", "Raiymbek", "Gogol", "Furmanov"]
+DISTRICTS = ["Medeu", "Bostandyk", "Almaly", "Auezov", "Alatau", "Nauryzbay", "Turksib", "Zhetysu", "Yesil", "Saryarka"]
+WORDS = ["bright", "renovated", "quiet", "spacious", "cozy", "mountain", "view", "balcony", "parking", "furnished", "new", "brick", "panel", "center", "park", "school"]
+
+
+def seed(engine, rows: int, batch: int = 50_000):
+    rnd = random.Random(42)
+    with engine.begin() as conn:
+        for start in range(0, rows, batch):
+            conn.execute(insert(Ad), [
+                {
+                    "type": rnd.choice(["rent", "sale"]),
+                    "price": rnd.randint(50_000, 50_000_000),
+                    "address": f"{rnd.choice(STREETS)} {i}, {rnd.choice(DISTRICTS)} district",
+                    "area": rnd.uniform(20, 200),
+                    "rooms_count": rnd.randint(1, 6),
+                    "description": " ".join(rnd.choices(WORDS, k=12)),
+                    "owner_id": rnd.randint(1, 10_000),
+                }
+                for i in range(start, min(start + batch, rows))
+            ])
+
+
+def measure(run, terms: list[str]) -> list[float]:
+    timings = []
+    for term in terms:
+        started = time.perf_counter()
+        run(term)
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+
+def report(label: str, timings: list[float]):
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:>10}: p50={statistics.median(timings):.2f}ms p99={p99:.2f}ms")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    rnd = random.Random(7)
+    # Street name plus house number: what people type when looking for a
+    # specific listing, and selective enough that ranking is cheap.
+    terms = [f"{rnd.choice(STREETS)} {rnd.randrange(rows)}" for _ in range(queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        session_factory = sessionmaker(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            ensure_full_text_index(conn)
+
+        started = time.perf_counter()
+        seed(engine, rows)
+        print(f"seeded {rows} ads in {time.perf_counter() - started:.1f}s")
+
+        repository = AdsRepository()
+        with session_factory() as db:
+            def like(term: str):
+                query = db.query(Ad)
+                for word in term.split():
+                    query = query.filter(or_(Ad.address.like(f"%{word}%"), Ad.description.like(f"%{word}%")))
+                query.order_by(Ad.id).limit(10).all()
+                query.count()
+
+            def full_text(term: str):
+                repository.get_ads(db=db, limit=10, q=term)
+                repository.count_ads(db=db, q=term)
+
+            report("LIKE", measure(like, terms))
+            report("full-text", measure(full_text, terms))
+
+
+if __name__ == "__main__":
+    main()
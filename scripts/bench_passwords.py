@@ -0,0 +1,61 @@
+"""Measure password verification throughput at the configured cost.
+
+Reports logins per second per core for each algorithm, both inline and
+through the hashing pool, and the worst event-loop stall seen while the pool
+is busy. Cost parameters come from the same environment variables as the app
+(ARGON2_*, SCRYPT_*, PASSWORD_HASH_WORKERS).
+
+Usage: python -m scripts.bench_passwords [logins]
+"""
+import asyncio
+import os
+import sys
+import time
+
+from app.utils.passwords import ALGORITHMS, PASSWORD_HASH_WORKERS, PasswordHasher
+
+
+async def loop_lag(stop: asyncio.Event) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        worst = max(worst, time.perf_counter() - started - 0.001)
+    return worst * 1000
+
+
+async def pooled(hasher: PasswordHasher, stored: str, logins: int) -> tuple[float, float]:
+    stop = asyncio.Event()
+    lag = asyncio.create_task(loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(hasher.check_async(stored, "correct horse") for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return logins / elapsed, await lag
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    cores = os.cpu_count() or 1
+
+    print(f"{logins} logins, {cores} cores, {PASSWORD_HASH_WORKERS} hashing workers")
+    for algorithm in ALGORITHMS:
+        hasher = PasswordHasher(algorithm=algorithm)
+        stored = hasher.hash("correct horse")
+
+        started = time.perf_counter()
+        for _ in range(logins):
+            hasher.check(stored, "correct horse")
+        inline = logins / (time.perf_counter() - started)
+
+        throughput, lag = asyncio.run(pooled(hasher, stored, logins))
+        print(
+            f"{algorithm:>9}: {1000 / inline:6.1f}ms per login, "
+            f"inline {inline:6.1f}/s per core, pooled {throughput / min(cores, PASSWORD_HASH_WORKERS):6.1f}/s per core, "
+            f"worst loop stall {lag:.1f}ms"
+        )
+        hasher.executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Compare allocations of ORM entity reads with projected rows.
+
+Loads one 100-row search page as full Ad entities, as entities with the
+description deferred, and through the projected read path, and one ad for an
+ownership check as an entity versus a two-column Row. Reports tracemalloc
+allocated bytes and blocks and the time per page.
+
+Usage: python -m scripts.bench_projection [rows] [iterations]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import defer, sessionmaker
+
+from app.utils.ads_repository import Ad, AdsRepository
+from app.utils.database import Base
+
+
+PAGE_SIZE = 100
+
+
+def seed(engine, rows: int):
+    rnd = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(insert(Ad), [
+            {
+                "type": rnd.choice(["rent", "sale"]),
+                "price": rnd.randint(50_000, 50_000_000),
+                "address": f"Street {i}",
+                "area": rnd.uniform(20, 200),
+                "rooms_count": rnd.randint(1, 6),
+                "description": "x" * rnd.randint(200, 2000),
+                "owner_id": rnd.randint(1, 1000),
+                "latitude": rnd.uniform(43.1, 43.4),
+                "longitude": rnd.uniform(76.7, 77.1),
+            }
+            for i in range(rows)
+        ])
+
+
+def allocations(run) -> tuple[int, int]:
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    result = run()
+    stats = tracemalloc.take_snapshot().compare_to(snapshot, "filename")
+    tracemalloc.stop()
+    del result
+    return sum(stat.size_diff for stat in stats if stat.size_diff > 0), sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+
+
+def timing(run, iterations: int) -> float:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return statistics.median(timings)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        session_factory = sessionmaker(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed(engine, rows)
+
+        repository = AdsRepository()
+        with session_factory() as db:
+            def fresh(run):
+                # Entities stay in the identity map; clear it so every run
+                # pays for loading them, as a new request would.
+                def wrapped():
+                    db.expunge_all()
+                    return run()
+                return wrapped
+
+            cases = [
+                ("page: entities", fresh(lambda: db.query(Ad).order_by(Ad.price, Ad.id).limit(PAGE_SIZE).all())),
+                ("page: deferred description", fresh(lambda: db.query(Ad).options(defer(Ad.description)).order_by(Ad.price, Ad.id).limit(PAGE_SIZE).all())),
+                ("page: projection", fresh(lambda: repository.get_ads(db=db, limit=PAGE_SIZE))),
+                ("owner: entity", fresh(lambda: repository.get_ad_by_id(db=db, ad_id=rows // 2))),
+                ("owner: row", fresh(lambda: repository.get_ad_owner(db=db, ad_id=rows // 2))),
+            ]
+
+            print(f"{PAGE_SIZE}-row page over {rows} ads, {iterations} iterations")
+            for label, run in cases:
+                run()
+                size, blocks = allocations(run)
+                print(f"{label:>28}: {size / 1024:8.1f} KiB in {blocks:6d} blocks, p50={timing(run, iterations):8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Measure the per-request overhead of the rate-limit middleware.
+
+Drives the middleware directly with a no-op ASGI app, so the numbers are the
+limiter's own cost: route matching, bucket updates and the 429 path. The Redis
+store runs against fakeredis when it is installed (real servers add one round
+trip per bucket).
+
+Usage: python -m scripts.bench_rate_limit [requests]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from app.utils.rate_limit import DEFAULT_RULES, MemoryBucketStore, RateLimitMiddleware, RedisBucketStore, build_rules
+
+
+async def noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def measure(middleware, requests: int, clients: int) -> tuple[float, int]:
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    statuses = []
+    timings = []
+    for i in range(requests):
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/shanyraks",
+            "client": (f"10.0.{i % clients // 256}.{i % clients % 256}", 5000),
+            "headers": [(b"authorization", f"Bearer user{i % clients}".encode())],
+        }
+        started = time.perf_counter()
+        await middleware(scope, None, send)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return statistics.median(timings), statuses.count(429)
+
+
+async def run(requests: int):
+    rules = build_rules(DEFAULT_RULES)
+    stores = [("memory", MemoryBucketStore())]
+    try:
+        import fakeredis
+
+        stores.append(("redis (fake)", RedisBucketStore(fakeredis.FakeAsyncRedis())))
+    except ImportError:
+        print("fakeredis is not installed, skipping the Redis store")
+
+    baseline, _ = await measure(noop_app, requests, 1000)
+    print(f"{requests} requests, no-op app alone p50={baseline:.1f}us")
+    for name, store in stores:
+        middleware = RateLimitMiddleware(noop_app, store=store, rules=rules, identify=lambda token: token)
+        for clients, label in ((1000, "under limit"), (1, "one hot client")):
+            p50, limited = await measure(middleware, requests, clients)
+            print(f"{name:>13}, {label:>14}: p50={p50:7.1f}us overhead={p50 - baseline:7.1f}us, {limited} limited")
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    asyncio.run(run(requests))
+
+
+if __name__ == "__main__":
+    main()
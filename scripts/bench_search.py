@@ -0,0 +1,96 @@
+"""Seed a throwaway database with ads and measure GET /shanyraks search latency.
+
+Usage: python -m scripts.bench_search [rows] [queries]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app.utils.ads_repository import Ad, AdsRepository
+from app.utils.database import Base
+
+
+TYPES = ["rent", "sale"]
+INDEXES = [index.name for index in Ad.__table__.indexes if index.name != "ix_advertisements_id"]
+
+
+def seed(engine, rows: int, batch: int = 50_000):
+    rnd = random.Random(42)
+    with engine.begin() as conn:
+        for start in range(0, rows, batch):
+            conn.execute(insert(Ad), [
+                {
+                    "type": rnd.choice(TYPES),
+                    "price": rnd.randint(50_000, 50_000_000),
+                    "address": f"Street {i}",
+                    "area": rnd.uniform(20, 200),
+                    "rooms_count": rnd.randint(1, 6),
+                    "description": "bench",
+                    "owner_id": rnd.randint(1, 10_000),
+                }
+                for i in range(start, min(start + batch, rows))
+            ])
+
+
+def run_queries(session_factory, queries: int) -> list[float]:
+    rnd = random.Random(7)
+    repository = AdsRepository()
+    timings = []
+    with session_factory() as db:
+        for _ in range(queries):
+            price_from = rnd.randint(50_000, 40_000_000)
+            params = {
+                "type": rnd.choice(TYPES),
+                "rooms_count": rnd.randint(1, 6),
+                "price_from": price_from,
+                "price_until": price_from + 1_000_000,
+            }
+            started = time.perf_counter()
+            repository.get_ads(db=db, skip=0, limit=10, **params)
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label: str, timings: list[float]):
+    timings = sorted(timings)
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:>16}: p50={p50:.2f}ms p99={p99:.2f}ms")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        session_factory = sessionmaker(bind=engine)
+        Base.metadata.create_all(bind=engine)
+
+        with engine.begin() as conn:
+            for name in INDEXES:
+                conn.execute(text(f"DROP INDEX {name}"))
+
+        started = time.perf_counter()
+        seed(engine, rows)
+        print(f"seeded {rows} ads in {time.perf_counter() - started:.1f}s")
+
+        report("without indexes", run_queries(session_factory, queries))
+
+        with engine.begin() as conn:
+            for index in Ad.__table__.indexes:
+                if index.name in INDEXES:
+                    index.create(conn)
+            conn.execute(text("ANALYZE"))
+
+        report("with indexes", run_queries(session_factory, queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Measure the cost of building and serializing a 100-item search page.
+
+Compares the old path (ORM entities -> AdResponse per row -> jsonable_encoder
+-> JSONResponse) with the projected rows encoded by ORJSONResponse.
+
+Usage: python -m scripts.bench_serialization [rows] [iterations]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.utils.ads_repository import Ad, AdsRepository
+from app.utils.database import Base
+from app.utils.schemas import AdResponse
+
+
+PAGE_SIZE = 100
+
+
+def seed(engine, rows: int):
+    rnd = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(insert(Ad), [
+            {
+                "type": rnd.choice(["rent", "sale"]),
+                "price": rnd.randint(50_000, 50_000_000),
+                "address": f"Street {i}",
+                "area": rnd.uniform(20, 200),
+                "rooms_count": rnd.randint(1, 6),
+                "description": "x" * rnd.randint(200, 2000),
+                "owner_id": rnd.randint(1, 1000),
+                "latitude": rnd.uniform(43.1, 43.4),
+                "longitude": rnd.uniform(76.7, 77.1),
+            }
+            for i in range(rows)
+        ])
+
+
+def orm_page(db) -> list[AdResponse]:
+    result = db.query(Ad).order_by(Ad.price, Ad.id).limit(PAGE_SIZE).all()
+    objects = [AdResponse(id=ad.id, type=ad.type, price=ad.price, address=ad.address, area=ad.area, rooms_count=ad.rooms_count, latitude=ad.latitude, longitude=ad.longitude) for ad in result]
+    # The search cache round-trip validated every row a second time.
+    return [AdResponse(**ad.model_dump()) for ad in objects]
+
+
+def orm_render(objects: list[AdResponse]) -> bytes:
+    return JSONResponse(jsonable_encoder({"total": len(objects), "objects": objects})).body
+
+
+def projected_page(repository: AdsRepository, db) -> list[dict]:
+    return repository.get_ads(db=db, limit=PAGE_SIZE)
+
+
+def projected_render(objects: list[dict]) -> bytes:
+    return ORJSONResponse({"total": len(objects), "objects": objects}).body
+
+
+def measure(run, iterations: int) -> list[float]:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return sorted(timings)
+
+
+def report(label: str, timings: list[float]):
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:>24}: p50={statistics.median(timings):8.1f}us p99={p99:8.1f}us")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        session_factory = sessionmaker(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed(engine, rows)
+
+        repository = AdsRepository()
+        with session_factory() as db:
+            orm_objects = orm_page(db)
+            projected_objects = projected_page(repository, db)
+            assert [ad.id for ad in orm_objects] == [ad["id"] for ad in projected_objects]
+
+            print(f"{PAGE_SIZE}-item page, {iterations} iterations")
+            report("serialize: orm+pydantic", measure(lambda: orm_render(orm_objects), iterations))
+            report("serialize: orjson", measure(lambda: projected_render(projected_objects), iterations))
+
+            def orm_end_to_end():
+                db.expunge_all()
+                orm_render(orm_page(db))
+
+            report("page: orm+pydantic", measure(orm_end_to_end, iterations))
+            report("page: projection+orjson", measure(lambda: projected_render(projected_page(repository, db)), iterations))
+
+
+if __name__ == "__main__":
+    main()
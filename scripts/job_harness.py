@@ -0,0 +1,130 @@
+"""Exercise the background job queue against a throwaway SQLite database.
+
+Runs three scenarios with a handler that fails at the given rate:
+outbox jobs with retries, a simulated crash mid-run followed by a restart,
+and a graceful drain of in-memory jobs on shutdown.
+
+Usage: python -m scripts.job_harness [jobs] [failure_rate]
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.utils.database import Base
+from app.utils.jobs import JobQueue, OutboxJob, enqueue
+
+
+def make_queue(session_factory, seen: Counter, failure_rate: float, delay: float = 0.0, **options) -> JobQueue:
+    rnd = random.Random()
+    queue = JobQueue(session_factory, max_attempts=10, batch_size=10, poll_seconds=0.05, backoff_seconds=0.01, backoff_max_seconds=0.05, **options)
+
+    @queue.register("flaky")
+    def flaky(db, payload):
+        if delay:
+            time.sleep(delay)
+        if rnd.random() < failure_rate:
+            raise RuntimeError("injected failure")
+        seen[payload["n"]] += 1
+
+    return queue
+
+
+def outbox_state(session_factory) -> tuple[int, int]:
+    with session_factory() as db:
+        pending = db.execute(select(func.count()).select_from(OutboxJob).where(OutboxJob.failed_at.is_(None))).scalar()
+        failed = db.execute(select(func.count()).select_from(OutboxJob).where(OutboxJob.failed_at.is_not(None))).scalar()
+    return pending, failed
+
+
+def write_jobs(session_factory, jobs: int, start: int = 0):
+    # One transaction per job, as create_ad and create_comment do.
+    for n in range(start, start + jobs):
+        with session_factory() as db:
+            enqueue(db, "flaky", {"n": n})
+            db.commit()
+
+
+async def wait_for_outbox(session_factory, timeout: float = 60) -> tuple[int, int]:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pending, failed = outbox_state(session_factory)
+        if pending == 0:
+            break
+        await asyncio.sleep(0.05)
+    return outbox_state(session_factory)
+
+
+async def outbox_with_retries(session_factory, jobs: int, failure_rate: float):
+    seen = Counter()
+    queue = make_queue(session_factory, seen, failure_rate)
+    write_jobs(session_factory, jobs)
+
+    started = time.perf_counter()
+    await queue.start()
+    pending, failed = await wait_for_outbox(session_factory)
+    elapsed = time.perf_counter() - started
+    await queue.stop()
+
+    print(f"outbox: {len(seen)}/{jobs} jobs done in {elapsed:.2f}s, pending {pending}, failed {failed}, duplicates {sum(seen.values()) - len(seen)}")
+
+
+async def crash_and_restart(session_factory, jobs: int, failure_rate: float):
+    seen = Counter()
+    write_jobs(session_factory, jobs, start=jobs)
+
+    # Kill the workers mid-run without draining, as a crash would.
+    queue = make_queue(session_factory, seen, failure_rate, delay=0.01, lease_seconds=0.5)
+    await queue.start()
+    await asyncio.sleep(0.2)
+    for task in queue.tasks:
+        task.cancel()
+    await asyncio.gather(*queue.tasks, return_exceptions=True)
+    done_before = len(seen)
+
+    # Rows claimed by the dead queue come back once their lease expires.
+    queue = make_queue(session_factory, seen, failure_rate, lease_seconds=0.5)
+    await queue.start()
+    pending, failed = await wait_for_outbox(session_factory)
+    await queue.stop()
+
+    print(f"crash: {done_before} done before the crash, {len(seen)}/{jobs} after restart, pending {pending}, failed {failed}, duplicates {sum(seen.values()) - len(seen)}")
+
+
+async def drain_on_shutdown(session_factory, jobs: int):
+    seen = Counter()
+    queue = make_queue(session_factory, seen, 0.0, delay=0.001, maxsize=jobs)
+    await queue.start()
+    accepted = sum(queue.submit("flaky", {"n": n}) for n in range(jobs))
+
+    started = time.perf_counter()
+    await queue.stop()
+    print(f"drain: {accepted} submitted, {len(seen)} done before stop returned in {time.perf_counter() - started:.2f}s")
+
+
+async def main():
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    failure_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    # Retries are expected here; only give up messages are worth showing.
+    logging.getLogger("saniraq.jobs").setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'jobs.db')}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine, tables=[OutboxJob.__table__])
+        session_factory = sessionmaker(bind=engine, autoflush=False)
+
+        await outbox_with_retries(session_factory, jobs, failure_rate)
+        await crash_and_restart(session_factory, jobs, failure_rate)
+        await drain_on_shutdown(session_factory, jobs)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
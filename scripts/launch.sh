@@ -6,6 +6,12 @@
 : "${APP_MODULE:=$MODULE_NAME:$VARIABLE_NAME}"
 : "${HOST:=0.0.0.0}"
 : "${PORT:=8000}"
+# The rate limiter keys per-IP buckets on the X-Forwarded-For entry this many
+# proxies from the end, i.e. the address Railway's edge proxy appended; the
+# entries before it are whatever the client sent. Set it to 0 when the app is
+# reached directly, so the peer address is used instead.
+: "${TRUSTED_PROXY_HOPS:=1}"
+export TRUSTED_PROXY_HOPS
 
 # Start uvicorn with live-reload
 uvicorn \
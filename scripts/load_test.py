@@ -0,0 +1,55 @@
+"""Hammer a running server with concurrent GET /shanyraks requests.
+
+Usage: python -m scripts.load_test [base_url] [concurrency] [requests]
+Requires httpx. Start the server with RATE_LIMIT_ENABLED=false, or every
+request past the per-IP search limit comes back as 429.
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+
+async def worker(client: httpx.AsyncClient, queue: asyncio.Queue, timings: list[float], errors: list[int]):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+
+        started = time.perf_counter()
+        try:
+            response = await client.get("/shanyraks", params={"limit": 10, "type": "rent"})
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        except httpx.HTTPError:
+            errors.append(0)
+        timings.append((time.perf_counter() - started) * 1000)
+
+
+async def main():
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:8000"
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    total = int(sys.argv[3]) if len(sys.argv) > 3 else 10_000
+
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    timings, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, queue, timings, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    timings.sort()
+    print(f"{total} requests, {concurrency} connections, {elapsed:.1f}s")
+    print(f"throughput={total / elapsed:.0f} req/s errors={len(errors)}")
+    print(f"p50={statistics.median(timings):.1f}ms p99={timings[int(len(timings) * 0.99) - 1]:.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
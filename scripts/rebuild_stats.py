@@ -0,0 +1,31 @@
+"""Recompute the price statistics table from advertisements.
+
+The triggers keep ad_price_stats exact, so this is only needed after rows
+were changed with the triggers disabled or restored from a partial backup.
+It reports how far the old counters had drifted. The rebuild runs without
+the app's statement timeout, however large the table.
+
+Usage: python -m scripts.rebuild_stats
+"""
+import time
+
+from sqlalchemy import text
+
+from app.utils.database import engine
+from app.utils.stats import ensure_price_stats, rebuild_price_stats
+
+
+def main():
+    with engine.begin() as connection:
+        ensure_price_stats(connection)
+        before = connection.execute(text("SELECT coalesce(sum(count), 0) FROM ad_price_stats")).scalar()
+
+        started = time.perf_counter()
+        after = rebuild_price_stats(connection)
+        elapsed = time.perf_counter() - started
+
+    print(f"counted ads: {before} -> {after} (drift {after - before:+d}) in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
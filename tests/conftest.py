@@ -0,0 +1,37 @@
+import itertools
+import os
+import tempfile
+
+# The app reads its configuration at import time.
+directory = tempfile.mkdtemp()
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(directory, 'test.db')}",
+    "JWT_SECRET": "test-secret-test-secret-test-secret-00",
+    "SQL_TRACE": "true",
+    "SQL_TRACE_HEADER": "true",
+    "RATE_LIMIT_ENABLED": "false",
+    "JOBS_ENABLED": "false",
+})
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+usernames = (f"user{n}" for n in itertools.count())
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    # A user of its own per module, as they all share one database.
+    username = next(usernames)
+    client.post("/auth/users", json={"username": username, "phone": username, "password": "p", "name": "Owner", "city": "Almaty"})
+    response = client.post("/auth/users/login", data={"username": username, "password": "p"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
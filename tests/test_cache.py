@@ -0,0 +1,94 @@
+import fakeredis
+import pytest
+
+from app import main
+from app.utils.cache import RedisCache, TTLCache
+
+
+def redis_cache(**options) -> RedisCache:
+    return RedisCache(fakeredis.FakeRedis(), name="test", **options)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    if request.param == "memory":
+        return TTLCache(ttl=30, name="test")
+    return redis_cache(ttl=30)
+
+
+def test_get_set_delete(cache):
+    assert cache.get("search:0:[]") is None
+    cache.set("search:0:[]", {"total": 1, "objects": [{"id": 1}]})
+    assert cache.get("search:0:[]") == {"total": 1, "objects": [{"id": 1}]}
+
+    cache.delete("search:0:[]")
+    assert cache.get("search:0:[]") is None
+
+
+def test_bump_version(cache):
+    assert cache.get_version("ads") == 0
+    assert cache.bump_version("ads") == 1
+    assert cache.bump_version("ads") == 2
+    assert cache.get_version("ads") == 2
+    assert cache.get_version("ad:1") == 0
+
+
+def test_redis_entries_expire():
+    cache = redis_cache(ttl=30)
+    cache.set("ad:1:0", [{}, 1])
+    cache.set("ad:2:0", [{}, 1], ttl=5)
+    assert 25 < cache.client.ttl("saniraq:ad:1:0") <= 30
+    assert 0 < cache.client.ttl("saniraq:ad:2:0") <= 5
+
+
+@pytest.fixture(params=["memory", "redis"])
+def ads_cache(request, monkeypatch):
+    # The app's ads repository, on a fresh cache of each backend.
+    cache = TTLCache(ttl=30, name="ads") if request.param == "memory" else redis_cache(ttl=30)
+    monkeypatch.setattr(main.ads_repository.repository, "cache", cache)
+    return cache
+
+
+def test_search_is_fresh_after_edit(client, headers, ads_cache):
+    ad = {"type": "sell", "price": 5000, "address": "Dostyk 1", "area": 60, "rooms_count": 3, "description": "flat"}
+    ad_id = client.post("/shanyraks", headers=headers, json=ad).json()["id"]
+    url = "/shanyraks?type=sell&rooms_count=3&price_from=5000&price_until=5000"
+
+    # Twice, so the second page comes from the cache.
+    assert [found["id"] for found in client.get(url).json()["objects"]] == [ad_id]
+    assert [found["id"] for found in client.get(url).json()["objects"]] == [ad_id]
+    assert client.get(f"/shanyraks/{ad_id}", headers=headers).json()["price"] == 5000
+
+    response = client.patch(f"/shanyraks/{ad_id}", headers=headers, json={**ad, "price": 6000})
+    assert response.status_code == 200
+
+    assert client.get(url).json()["objects"] == []
+    assert client.get(f"/shanyraks/{ad_id}", headers=headers).json()["price"] == 6000
+
+    client.delete(f"/shanyraks/{ad_id}", headers=headers)
+
+
+def test_memory_versions_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.utils.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(ttl=30, name="test")
+    for ad_id in range(100):
+        cache.bump_version(f"ad:{ad_id}")
+
+    # Reads keep a version alive; the rest go once idle for twice the TTL.
+    now[0] += 40
+    assert cache.get_version("ad:1") == 1
+    now[0] += 40
+    assert cache.get_version("ad:2") == 0
+    assert list(cache.versions) == ["ad:1"]
+    assert cache.bump_version("ad:1") == 2
+
+
+def test_redis_versions_expire():
+    cache = redis_cache(ttl=30)
+    cache.bump_version("ad:1")
+    assert 50 < cache.client.ttl("saniraq:version:ad:1") <= 60
+
+    cache.client.expire("saniraq:version:ad:1", 10)
+    assert cache.get_version("ad:1") == 1
+    assert 50 < cache.client.ttl("saniraq:version:ad:1") <= 60
@@ -0,0 +1,32 @@
+import pytest
+
+from app.utils.pagination import encode_cursor
+
+
+@pytest.fixture(scope="module")
+def ad_id(client, headers):
+    ad = {"type": "rent", "price": 200, "address": "Tole bi 3", "area": 35, "rooms_count": 1, "description": "flat"}
+    ad_id = client.post("/shanyraks", headers=headers, json=ad).json()["id"]
+    for n in range(3):
+        client.post(f"/shanyraks/{ad_id}/comments", headers=headers, json={"content": f"comment {n}"})
+    return ad_id
+
+
+def test_comments_pages(client, headers, ad_id):
+    page = client.get(f"/shanyraks/{ad_id}/comments?limit=2", headers=headers).json()
+    rest = client.get(f"/shanyraks/{ad_id}/comments", headers=headers, params={"cursor": page["next_cursor"]}).json()
+    contents = [comment["content"] for comment in page["comments"] + rest["comments"]]
+    assert sorted(contents) == ["comment 0", "comment 1", "comment 2"]
+
+
+@pytest.mark.parametrize("values", [
+    ["2026-01-01T00:00:00", 10 ** 30],
+    ["2026-01-01T00:00:00", "1"],
+    ["2026-01-01T00:00:00", 1.5],
+    ["yesterday", 1],
+    [1, 1],
+    ["2026-01-01T00:00:00"],
+])
+def test_comments_reject_malformed_cursor(client, headers, ad_id, values):
+    response = client.get(f"/shanyraks/{ad_id}/comments", headers=headers, params={"cursor": encode_cursor(*values)})
+    assert response.status_code == 400
@@ -0,0 +1,19 @@
+from app.utils.database import SessionLocal
+from app.utils.favorites_repository import FavoritesRepository
+
+
+def test_add_favorite_twice(client, headers):
+    ad = {"type": "rent", "price": 300, "address": "Satpayev 5", "area": 30, "rooms_count": 1, "description": "flat"}
+    ad_id = client.post("/shanyraks", headers=headers, json=ad).json()["id"]
+    user_id = client.get("/auth/users/me", headers=headers).json()["id"]
+
+    # A second add, as from a concurrent request that lost the race, is a
+    # no-op rather than a primary key violation.
+    repository = FavoritesRepository()
+    with SessionLocal() as db:
+        assert repository.add_favorite(db, user_id=user_id, ad_id=ad_id)
+        assert not repository.add_favorite(db, user_id=user_id, ad_id=ad_id)
+
+    assert client.post(f"/auth/users/favorites/shanyraks/{ad_id}", headers=headers).status_code == 200
+    favorites = client.get("/auth/users/favorites/shanyraks", headers=headers).json()["shanyraks"]
+    assert [favorite["id"] for favorite in favorites] == [ad_id]
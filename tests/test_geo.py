@@ -0,0 +1,28 @@
+import pytest
+
+from app.utils.geo import MAX_ZOOM, MIN_ZOOM, geohash_precision_for_zoom
+
+
+BBOX = "min_lat=43&min_lng=76&max_lat=44&max_lng=77"
+
+
+def test_zoom_range_covers_every_precision():
+    assert geohash_precision_for_zoom(MIN_ZOOM) == 1
+    assert geohash_precision_for_zoom(MAX_ZOOM) == 12
+
+
+@pytest.mark.parametrize("zoom, status", [(MIN_ZOOM, 200), (MAX_ZOOM, 200), (-1, 422), (MAX_ZOOM + 1, 422)])
+def test_tiles_zoom_bounds(client, zoom, status):
+    assert client.get(f"/shanyraks/tiles?zoom={zoom}&{BBOX}").status_code == status
+
+
+@pytest.mark.parametrize("query, status", [
+    ("lat=43.2&lng=76.9&radius_km=5", 200),
+    ("lat=43.2&lng=76.9&radius_km=0", 422),
+    ("lat=43.2&lng=76.9&radius_km=-5", 422),
+    ("lat=43.2&lng=76.9&radius_km=100000", 422),
+    ("lat=91&lng=76.9&radius_km=5", 422),
+    ("min_lat=43&min_lng=76&max_lat=44&max_lng=181", 422),
+])
+def test_search_location_bounds(client, query, status):
+    assert client.get(f"/shanyraks?{query}").status_code == status
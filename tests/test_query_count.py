@@ -0,0 +1,58 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def ad_ids(client, headers):
+    ids = []
+    for i in range(15):
+        response = client.post("/shanyraks", headers=headers, json={
+            "type": "rent", "price": 100 + i, "address": f"Abay {i}", "area": 40.5, "rooms_count": 2, "description": "flat"
+        })
+        ids.append(response.json()["id"])
+    return ids
+
+
+def query_count(response) -> int:
+    return int(response.headers["x-query-count"])
+
+
+def test_edit_comment_query_count(client, headers, ad_ids):
+    client.post(f"/shanyraks/{ad_ids[0]}/comments", headers=headers, json={"content": "first"})
+    comment_id = client.get(f"/shanyraks/{ad_ids[0]}/comments", headers=headers).json()["comments"][0]["id"]
+
+    # A successful edit is the guarded UPDATE alone.
+    response = client.patch(f"/shanyraks/{ad_ids[0]}/comments/{comment_id}", headers=headers, json={"content": "edited"})
+    assert response.status_code == 200
+    assert query_count(response) == 1
+
+    # Only a miss pays for the lookups that tell the errors apart.
+    response = client.patch(f"/shanyraks/{ad_ids[0]}/comments/0", headers=headers, json={"content": "edited"})
+    assert response.status_code == 404
+    assert query_count(response) == 4
+
+
+@pytest.mark.parametrize("limit", [2, 10])
+def test_search_query_count(client, headers, ad_ids, limit):
+    url = f"/shanyraks?type=rent&limit={limit}&offset=1"
+
+    # A cache miss is the page and its total, whatever the page size.
+    response = client.get(url)
+    assert response.status_code == 200
+    assert len(response.json()["objects"]) == limit
+    assert query_count(response) == 2
+
+    response = client.get(url)
+    assert query_count(response) == 0
+
+    # Signed in, favorites are looked up for the whole page at once.
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert query_count(response) == 1
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_search_rejects_non_positive_limit(client, limit):
+    response = client.get(f"/shanyraks?limit={limit}")
+    assert response.status_code == 422
+    assert query_count(response) == 0
+
@@ -0,0 +1,96 @@
+import asyncio
+import types
+
+import fakeredis
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils import rate_limit
+from app.utils.rate_limit import Limit, MemoryBucketStore, RateLimitMiddleware, RedisBucketStore, build_rules
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Both stores read the time through the module, so tests move it by hand.
+    clock = types.SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(rate_limit, "time", types.SimpleNamespace(monotonic=lambda: clock.now, time=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return MemoryBucketStore()
+    return RedisBucketStore(fakeredis.FakeAsyncRedis())
+
+
+def take(store, *buckets) -> float:
+    return asyncio.run(store.take(list(buckets)))
+
+
+def test_bucket_refills(store, clock):
+    limit = Limit.parse("2/minute")
+    assert take(store, ("ip:a", limit)) == 0
+    assert take(store, ("ip:a", limit)) == 0
+    assert take(store, ("ip:a", limit)) == pytest.approx(30)
+
+    # Half a token back after 15s; a full one after 30s.
+    clock.now += 15
+    assert take(store, ("ip:a", limit)) == pytest.approx(15)
+    clock.now += 15
+    assert take(store, ("ip:a", limit)) == 0
+    assert take(store, ("ip:a", limit)) > 0
+
+
+def test_buckets_are_separate(store, clock):
+    login, signup = Limit.parse("1/minute"), Limit.parse("1/hour")
+    assert take(store, ("ip:a:POST /auth/users/login", login)) == 0
+    assert take(store, ("ip:a:POST /auth/users/login", login)) > 0
+    assert take(store, ("ip:b:POST /auth/users/login", login)) == 0
+    assert take(store, ("ip:a:POST /auth/users", signup)) == 0
+
+
+def test_limited_request_spends_nothing(store, clock):
+    # The user bucket is empty, so the IP bucket must keep its token.
+    ip, user = Limit.parse("2/minute"), Limit.parse("1/minute")
+    assert take(store, ("ip:a", ip), ("user:1", user)) == 0
+    assert take(store, ("ip:a", ip), ("user:1", user)) == pytest.approx(60)
+    assert take(store, ("ip:a", ip)) == 0
+
+
+def make_client(store, proxy_hops: int = 0) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/auth/users/login")
+    def login():
+        return {}
+
+    rules = build_rules({"POST /auth/users/login": {"ip": "2/minute"}})
+    app.add_middleware(RateLimitMiddleware, store=store, rules=rules, proxy_hops=proxy_hops)
+    return TestClient(app)
+
+
+def test_too_many_requests(store, clock):
+    client = make_client(store)
+    assert client.post("/auth/users/login").status_code == 200
+    assert client.post("/auth/users/login").status_code == 200
+
+    response = client.post("/auth/users/login")
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "30"
+    assert response.json() == {"detail": "Too many requests"}
+
+
+def test_spoofed_forwarded_for_is_ignored(store, clock):
+    # Behind one proxy only the entry it appended counts, so a client making
+    # up the rest of X-Forwarded-For still shares one bucket.
+    client = make_client(store, proxy_hops=1)
+    statuses = [
+        client.post("/auth/users/login", headers={"X-Forwarded-For": f"1.1.1.{n}, 203.0.113.9"}).status_code
+        for n in range(3)
+    ]
+    assert statuses == [200, 200, 429]
+
+    response = client.post("/auth/users/login", headers={"X-Forwarded-For": "203.0.113.10"})
+    assert response.status_code == 200
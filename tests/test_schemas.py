@@ -0,0 +1,26 @@
+import pytest
+from pydantic import ValidationError
+
+from app.utils.schemas import AdCreateRequest, AdEdit
+
+
+AD = {"type": "rent", "price": 100, "address": "Abay 1", "area": 40.5, "rooms_count": 2, "description": "flat"}
+
+
+@pytest.mark.parametrize("schema, fields", [(AdCreateRequest, AD), (AdEdit, {})])
+@pytest.mark.parametrize("location", [
+    {"latitude": 43.2},
+    {"longitude": 76.9},
+    {"latitude": 90.5, "longitude": 76.9},
+    {"latitude": 43.2, "longitude": -180.5},
+])
+def test_ad_location_rejected(schema, fields, location):
+    with pytest.raises(ValidationError):
+        schema(**fields, **location)
+
+
+@pytest.mark.parametrize("schema, fields", [(AdCreateRequest, AD), (AdEdit, {})])
+@pytest.mark.parametrize("location", [{}, {"latitude": -90, "longitude": 180}, {"latitude": 43.2, "longitude": 76.9}])
+def test_ad_location_accepted(schema, fields, location):
+    ad = schema(**fields, **location)
+    assert (ad.latitude, ad.longitude) == (location.get("latitude"), location.get("longitude"))
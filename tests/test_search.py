@@ -0,0 +1,26 @@
+import pytest
+
+from app.utils.pagination import encode_cursor
+
+
+@pytest.mark.parametrize("values", [[1, [2]], ["a", {}], [1, 2.5], [True, 1], [1, 10 ** 30], [1]])
+def test_search_rejects_malformed_cursor(client, values):
+    response = client.get("/shanyraks", params={"cursor": encode_cursor(*values)})
+    assert response.status_code == 400
+
+
+def test_search_rejects_huge_offset(client):
+    response = client.get("/shanyraks?offset=99999999999999999999")
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("accept, cache_control", [
+    ("application/json", "public, max-age=30, must-revalidate"),
+    ("application/x-ndjson", "no-store"),
+    ("text/csv", "no-store"),
+])
+def test_search_varies_on_accept(client, accept, cache_control):
+    response = client.get("/shanyraks", headers={"Accept": accept})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == cache_control
+    assert response.headers["vary"] == "Authorization, Accept"